@@ -29,14 +29,57 @@ def create_app(config_class=Config):
     # User loader for Flask-Login
     from app.models import User
     
+    from app.tenancy import resolve_user_id
+    
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        user_id = resolve_user_id(user_id)
+        return User.query.get(user_id) if user_id is not None else None
     
     # Register blueprints
     from app.routes import main
     app.register_blueprint(main)
     
+    # Full-text search index (must be registered before create_all)
+    from app import search
+    search.init_app(app)
+    
+    from app import phone
+    phone.init_app(app)
+    
+    from app import notifications
+    notifications.init_app(app)
+    
+    from app import tenancy
+    tenancy.init_app(app)
+    
+    from app import replicas
+    replicas.init_app(app)
+    
+    from app import ratelimit
+    ratelimit.init_app(app)
+    
+    from app import cache
+    cache.init_app(app)
+    
+    from app import assets
+    assets.init_app(app)
+    
+    from app import templating
+    templating.init_app(app)
+    
+    from app import jsonprovider
+    jsonprovider.init_app(app)
+    
+    from app import seed
+    seed.init_app(app)
+    
+    # Outermost middleware: take the client address and scheme from trusted proxies
+    proxy_hops = app.config.get('TRUSTED_PROXY_HOPS', 0)
+    if proxy_hops:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+    
     # Create database tables (best-effort). On platforms where the filesystem is read-only
     # (e.g. serverless), creation may fail; catch exceptions to avoid crashing the import.
     with app.app_context():
@@ -0,0 +1,176 @@
+"""
+Static asset pipeline and response compression
+
+``flask --app run assets-build`` copies every file under ``static/`` to
+``static/dist/`` with a content hash in its name, writes gzip (and brotli,
+when the ``brotli`` package is installed) variants next to it, and records
+the mapping in ``static/dist/manifest.json``. Templates link assets through
+``asset_url()``, which returns the fingerprinted ``/assets/...`` URL when a
+build exists and the plain static URL otherwise. Fingerprinted files never
+change, so they are served with a one-year immutable cache lifetime, using
+the pre-compressed variant the client accepts.
+
+HTML and JSON responses above ``COMPRESS_MIN_SIZE`` bytes are compressed on
+the fly according to ``Accept-Encoding``.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from flask import Blueprint, current_app, request, send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+ONE_YEAR = 365 * 24 * 3600
+
+COMPRESSIBLE_TYPES = {'text/html', 'application/json', 'text/css', 'text/javascript',
+                      'application/javascript', 'text/plain'}
+
+assets = Blueprint('assets', __name__)
+
+
+# ============= BUILD =============
+
+def _fingerprint(relative_path, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    root, ext = os.path.splitext(relative_path)
+    return f'{root}.{digest}{ext}'
+
+
+def build_assets(static_folder):
+    """Fingerprint and pre-compress every static file; returns the manifest"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+    manifest = {}
+
+    for directory, subdirs, files in os.walk(static_folder):
+        subdirs[:] = [d for d in subdirs if os.path.join(directory, d) != dist]
+        for name in files:
+            source = os.path.join(directory, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                content = f.read()
+
+            hashed = _fingerprint(relative, content)
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+            # mtime=0 keeps the gzip output reproducible across builds
+            with open(target + '.gz', 'wb') as f:
+                f.write(gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target + '.br', 'wb') as f:
+                    f.write(brotli.compress(content, quality=11))
+            manifest[relative] = hashed
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_url(filename):
+    """URL for a static file, fingerprinted when an asset build is available"""
+    hashed = current_app.extensions['asset_manifest'].get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('assets.serve_asset', filename=hashed)
+
+
+# ============= SERVING =============
+
+def _accepts(encoding):
+    return encoding in request.accept_encodings and request.accept_encodings[encoding] > 0
+
+
+@assets.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Serve a fingerprinted asset, pre-compressed when the client allows it"""
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    if filename.endswith(('.gz', '.br')) or filename == MANIFEST:
+        raise NotFound()
+
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if _accepts(candidate) and os.path.isfile(os.path.join(dist, filename + suffix)):
+            encoding = candidate
+            break
+
+    if encoding is None:
+        response = send_from_directory(dist, filename, max_age=ONE_YEAR)
+    else:
+        suffix = '.br' if encoding == 'br' else '.gz'
+        response = send_from_directory(dist, filename + suffix, max_age=ONE_YEAR)
+        # Report the original type, not application/gzip
+        response.mimetype = _guess_mimetype(filename)
+        response.headers['Content-Encoding'] = encoding
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _guess_mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+# ============= DYNAMIC COMPRESSION =============
+
+def compress_response(response):
+    """Compress HTML/JSON responses the client accepts, above the size threshold"""
+    if (response.status_code < 200 or response.status_code >= 300 or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    if brotli is not None and _accepts('br'):
+        body, encoding = brotli.compress(data, quality=current_app.config['COMPRESS_BROTLI_QUALITY']), 'br'
+    elif _accepts('gzip'):
+        body, encoding = gzip.compress(data, compresslevel=current_app.config['COMPRESS_GZIP_LEVEL']), 'gzip'
+    else:
+        return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    """Register asset serving, the asset_url helper, compression and the build command"""
+    app.register_blueprint(assets)
+    app.extensions['asset_manifest'] = load_manifest(app.static_folder)
+    app.add_template_global(asset_url)
+
+    if app.config.get('COMPRESS_ENABLED'):
+        app.after_request(compress_response)
+
+    @app.cli.command('assets-build')
+    def assets_build():
+        """Fingerprint and pre-compress static files into static/dist"""
+        manifest = build_assets(app.static_folder)
+        for source, hashed in sorted(manifest.items()):
+            print(f'{source} -> {DIST_DIR}/{hashed}')
+        if brotli is None:
+            print('brotli is not installed; only gzip variants were written.')
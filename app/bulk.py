@@ -0,0 +1,75 @@
+"""
+Bulk admin operations on appointments and doctors
+
+Each operation runs set-based ``UPDATE`` statements (no rows loaded into the
+session) and commits them in one transaction together with the cancellation
+notifications it queues in the outbox, and returns a dict of affected row
+counts. Open booking forms are told about freed slots after the commit.
+"""
+from datetime import date, datetime
+from sqlalchemy import update
+from app.database import db
+from app.models import Appointment, Doctor, Schedule
+from app import notifications
+from app.events import publish_slot_change
+from app.cache import invalidate
+
+
+def _cancel_where(*criteria):
+    """Cancel matching scheduled appointments; returns their (id, doctor_id, date, time) rows"""
+    return db.session.execute(
+        update(Appointment)
+        .where(Appointment.status == 'scheduled', *criteria)
+        .values(status='cancelled', updated_at=datetime.utcnow())
+        .returning(Appointment.id, Appointment.doctor_id,
+                   Appointment.appointment_date, Appointment.appointment_time)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+
+def cancel_doctor_appointments(doctor_id, start_date, end_date):
+    """Cancel a doctor's scheduled appointments from ``start_date`` to ``end_date`` inclusive"""
+    cancelled = _cancel_where(Appointment.doctor_id == doctor_id,
+                              Appointment.appointment_date.between(start_date, end_date))
+    queued = notifications.enqueue_many([row.id for row in cancelled], 'cancellation')
+    db.session.commit()
+
+    for row in cancelled:
+        publish_slot_change(row, available=True)
+    return {'cancelled': len(cancelled), 'notifications': queued}
+
+
+def complete_appointments(appointment_ids):
+    """Mark the given scheduled appointments completed"""
+    if not appointment_ids:
+        return {'completed': 0}
+    completed = db.session.execute(
+        update(Appointment)
+        .where(Appointment.id.in_(appointment_ids), Appointment.status == 'scheduled')
+        .values(status='completed', updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return {'completed': completed}
+
+
+def deactivate_doctor(doctor_id, today=None):
+    """Deactivate a doctor, their schedules, and cancel their bookings from ``today`` on"""
+    today = today or date.today()
+    doctors = db.session.execute(
+        update(Doctor).where(Doctor.id == doctor_id, Doctor.is_active.is_(True))
+        .values(is_active=False).execution_options(synchronize_session=False)
+    ).rowcount
+    schedules = db.session.execute(
+        update(Schedule).where(Schedule.doctor_id == doctor_id, Schedule.is_active.is_(True))
+        .values(is_active=False).execution_options(synchronize_session=False)
+    ).rowcount
+    cancelled = _cancel_where(Appointment.doctor_id == doctor_id,
+                              Appointment.appointment_date >= today)
+    queued = notifications.enqueue_many([row.id for row in cancelled], 'cancellation')
+    db.session.commit()
+
+    # No slot events: the doctor can no longer be booked at all
+    invalidate('doctors', 'schedules')
+    return {'doctors': doctors, 'schedules': schedules,
+            'cancelled': len(cancelled), 'notifications': queued}
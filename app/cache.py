@@ -0,0 +1,274 @@
+"""
+Cache shared by all worker processes on a host
+
+Entries live in a SQLite file (WAL mode), so every gunicorn worker reads the
+same copy and an invalidation made by one worker is seen by all of them.
+
+- entries expire after a TTL and the least recently used are evicted once
+  the cache holds more than ``CACHE_MAX_ENTRIES``
+- ``get_or_compute`` takes a short lease per key so that when a hot entry
+  expires only one worker recomputes it while the others wait for the result
+- invalidation is by version counter: cached keys embed the current version
+  of the namespaces they depend on (``doctors``, ``schedules``,
+  ``specialties``...), and admin writes ``bump`` a namespace, which makes
+  every dependent key unreachable at once without scanning the cache
+
+Keys and namespaces are scoped to the current tenant. Values are stored as
+JSON, never pickled, and the default file lives in a per-user directory that
+only its owner can open, so other local users can neither read entries nor
+plant them.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from flask import current_app
+from app.tenancy import cache_key
+from app.replicas import reading_from_primary
+
+_MISSING = object()
+
+
+class SharedCache:
+    """SQLite-file cache with TTLs, LRU eviction, stampede protection and versioned namespaces"""
+
+    # Refresh an entry's LRU timestamp at most this often, to keep hits read-only
+    TOUCH_INTERVAL = 10
+    EVICT_EVERY = 100  # writes between eviction passes
+
+    def __init__(self, path, max_entries=10000, default_ttl=300):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        self._writes = 0
+        connection = self._connect()
+        connection.executescript(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY, value BLOB NOT NULL,'
+            ' expires_at REAL NOT NULL, accessed_at REAL NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS ix_entries_accessed_at ON entries (accessed_at);'
+            'CREATE TABLE IF NOT EXISTS versions (namespace TEXT PRIMARY KEY, version INTEGER NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, expires_at REAL NOT NULL);')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    # ----- entries -----
+
+    def get(self, key, default=None):
+        now = time.time()
+        connection = self._connect()
+        row = connection.execute(
+            'SELECT value, expires_at, accessed_at FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] <= now:
+            return default
+        try:
+            value = json.loads(row[0])
+        except ValueError:
+            # Written by an older release in another format; treat as a miss
+            return default
+        if now - row[2] > self.TOUCH_INTERVAL:
+            connection.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+        return value
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        connection = self._connect()
+        connection.execute(
+            'INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value, separators=(',', ':')), now + ttl, now))
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self.evict(now)
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connect().executescript('DELETE FROM entries; DELETE FROM leases;')
+
+    def evict(self, now=None):
+        """Drop expired entries, then the least recently used beyond ``max_entries``"""
+        now = now or time.time()
+        connection = self._connect()
+        connection.execute('DELETE FROM entries WHERE expires_at <= ?', (now,))
+        connection.execute(
+            'DELETE FROM entries WHERE key IN ('
+            ' SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,))
+        connection.execute('DELETE FROM leases WHERE expires_at <= ?', (now,))
+
+    # ----- stampede protection -----
+
+    def _acquire_lease(self, key, seconds):
+        now = time.time()
+        cursor = self._connect().execute(
+            'INSERT INTO leases (key, expires_at) VALUES (?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at '
+            'WHERE leases.expires_at <= ?', (key, now + seconds, now))
+        return cursor.rowcount == 1
+
+    def _release_lease(self, key):
+        self._connect().execute('DELETE FROM leases WHERE key = ?', (key,))
+
+    def get_or_compute(self, key, compute, ttl=None, lease_seconds=10, poll_interval=0.02):
+        """Return the cached value for ``key``, computing and storing it on a miss
+
+        Only the worker holding the key's lease runs ``compute``; others poll
+        for its result, and compute it themselves only if the lease expires.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        deadline = time.monotonic() + lease_seconds
+        leased = self._acquire_lease(key, lease_seconds)
+        while not leased and time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            leased = self._acquire_lease(key, lease_seconds)
+
+        try:
+            # Another worker may have finished between our miss and the lease
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                value = compute()
+                self.set(key, value, ttl)
+            return value
+        finally:
+            if leased:
+                self._release_lease(key)
+
+    # ----- versioned namespaces -----
+
+    def version(self, namespace):
+        row = self._connect().execute(
+            'SELECT version FROM versions WHERE namespace = ?', (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def versions(self, namespaces):
+        if not namespaces:
+            return {}
+        rows = self._connect().execute(
+            'SELECT namespace, version FROM versions WHERE namespace IN ({})'.format(
+                ','.join('?' * len(namespaces))), tuple(namespaces)).fetchall()
+        found = dict(rows)
+        return {ns: found.get(ns, 0) for ns in namespaces}
+
+    def bump(self, namespace):
+        """Invalidate every key that depends on ``namespace``"""
+        self._connect().execute(
+            'INSERT INTO versions (namespace, version) VALUES (?, 1) '
+            'ON CONFLICT(namespace) DO UPDATE SET version = version + 1', (namespace,))
+
+
+class NullCache:
+    """Stand-in used when caching is disabled: always computes"""
+
+    def get(self, key, default=None):
+        return default
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def get_or_compute(self, key, compute, ttl=None, **kwargs):
+        return compute()
+
+    def versions(self, namespaces):
+        return {ns: 0 for ns in namespaces}
+
+    def bump(self, namespace):
+        pass
+
+
+def get_cache():
+    return current_app.extensions['cache']
+
+
+def versioned_key(key, depends_on=()):
+    """Tenant-scoped key that changes whenever a namespace it depends on is bumped"""
+    namespaces = [cache_key('ns', ns) for ns in depends_on]
+    versions = get_cache().versions(namespaces)
+    suffix = ','.join(f'{ns}={versions[full]}' for ns, full in zip(depends_on, namespaces))
+    return cache_key(key) + (f'|{suffix}' if suffix else '')
+
+
+def memoize(key, compute, ttl=None, depends_on=()):
+    """Get ``key`` from the shared cache, computing it at most once across workers on a miss
+
+    Misses are computed against the primary: a lagging replica could still
+    return the rows an admin write just replaced, and caching them under the
+    freshly bumped namespace version would serve them until the TTL expires.
+    """
+    def compute_on_primary():
+        with reading_from_primary():
+            return compute()
+
+    return get_cache().get_or_compute(versioned_key(key, depends_on), compute_on_primary, ttl)
+
+
+def invalidate(*namespaces):
+    """Bump the current tenant's namespaces after a write"""
+    cache = get_cache()
+    for namespace in namespaces:
+        cache.bump(cache_key('ns', namespace))
+
+
+def private_dir(name):
+    """Per-user directory in the temp dir that only the current user can open
+
+    Follows Jinja's ``FileSystemBytecodeCache`` default: the directory is
+    created with mode 0700, and refused if it already exists with another
+    owner or wider permissions.
+    """
+    if os.name == 'nt':
+        return tempfile.gettempdir()
+    path = os.path.join(tempfile.gettempdir(), f'{name}-{os.getuid()}')
+    try:
+        os.mkdir(path, stat.S_IRWXU)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if (info.st_uid != os.getuid() or not stat.S_ISDIR(info.st_mode)
+            or stat.S_IMODE(info.st_mode) != stat.S_IRWXU):
+        raise RuntimeError(f'{path} is not a private directory of the current user; '
+                           'remove it or set CACHE_PATH')
+    return path
+
+
+def init_app(app):
+    """Create the shared cache configured by ``CACHE_*`` settings"""
+    if not app.config.get('CACHE_ENABLED'):
+        app.extensions['cache'] = NullCache()
+        return
+    path = app.config.get('CACHE_PATH')
+    if not path:
+        # One file per database so apps on different databases never share entries
+        digest = hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:12]
+        path = os.path.join(private_dir('easybook-cache'), f'{digest}.db')
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    app.extensions['cache'] = SharedCache(path,
+                                          max_entries=app.config['CACHE_MAX_ENTRIES'],
+                                          default_ttl=app.config['CACHE_DEFAULT_TTL'])
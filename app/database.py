@@ -1,9 +1,47 @@
 """
 Database initialization and configuration
 """
+from flask import g, has_app_context, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 
-db = SQLAlchemy()
+
+class RoutingSession(Session):
+    """Session that routes statements to the engine chosen for the current request
+
+    The engines are picked per request and stored on ``g``: ``db_engine`` is
+    the tenant's primary (see ``app.tenancy``) and ``db_replica`` a read
+    replica (see ``app.replicas``). Flushes, DML statements and every read
+    after the session has written go to the primary, so a request always
+    sees its own writes. CLI commands bind ``db_engine`` on the app context
+    with ``tenant_context``; otherwise the default engine is used.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if getattr(clause, 'is_dml', False):
+            self._mark_write()
+        if bind is None and has_app_context():
+            if not self._flushing and not self.info.get('wrote'):
+                replica = g.get('db_replica')
+                if replica is not None:
+                    return replica
+            engine = g.get('db_engine')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            self._mark_write()
+        super().flush(objects)
+
+    def _mark_write(self):
+        self.info['wrote'] = True
+        if has_request_context():
+            g.db_wrote = True
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 def init_db(app):
     """Initialize database with app"""
@@ -11,4 +49,4 @@ def init_db(app):
     
     with app.app_context():
         db.create_all()
-        print("Database tables created successfully!")
\ No newline at end of file
+        print("Database tables created successfully!")
@@ -0,0 +1,213 @@
+"""
+In-process publish/subscribe channel for live slot updates
+
+``book_appointment`` and ``cancel_appointment`` publish to a (doctor, date)
+channel after committing; the SSE endpoint streams those events to every
+open booking form for that doctor and date.
+
+Each channel keeps a short ring buffer of recent events with sequence
+numbers and one condition variable. Streams send ``<epoch>-<sequence>`` as
+the event id, so a reconnecting EventSource (which repeats it in
+``Last-Event-ID``) resumes where it stopped; when the gap cannot be replayed
+from the buffer, or the channel was recreated in between, it is told to
+resync instead. A subscriber is only a cursor into that
+buffer, so idle subscribers hold almost no memory and publishing is an
+append plus a single ``notify_all`` regardless of how many are listening.
+Waiting uses ``threading`` primitives, which gevent monkey-patches, so under
+``gunicorn -k gevent`` every stream is a greenlet rather than a blocked
+worker thread.
+
+Without a cooperative worker every open stream would pin a sync worker, so
+with ``SSE_ENABLED = 'auto'`` the endpoint is only served when threading is
+monkey-patched and booking forms poll for slot changes otherwise.
+
+The broker only reaches subscribers connected to the same worker process.
+"""
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from app.tenancy import tenant_key
+
+# Recent events kept per channel; subscribers further behind must resync
+CHANNEL_BUFFER_SIZE = 64
+
+
+class _Channel:
+    __slots__ = ('epoch', 'condition', 'events', 'sequence', 'subscribers')
+
+    def __init__(self):
+        # Distinguishes sequence numbers of this channel from an earlier or
+        # another worker's channel for the same key
+        self.epoch = uuid.uuid4().hex[:12]
+        self.condition = threading.Condition(threading.Lock())
+        self.events = deque(maxlen=CHANNEL_BUFFER_SIZE)
+        self.sequence = 0
+        self.subscribers = 0
+
+
+class Subscription:
+    """A single listener on a (doctor_id, date) channel"""
+
+    __slots__ = ('broker', 'key', 'channel', 'cursor', 'resync')
+
+    def __init__(self, broker, key, channel, last_event_id=None):
+        self.broker = broker
+        self.key = key
+        self.channel = channel
+        self.resync = False
+        with channel.condition:
+            self.cursor = channel.sequence
+            if last_event_id is not None:
+                epoch, _, sequence = last_event_id.partition('-')
+                if epoch == channel.epoch and sequence.isdigit() \
+                        and int(sequence) <= channel.sequence:
+                    self.cursor = int(sequence)
+                else:
+                    self.resync = True
+
+    def event_id(self, sequence):
+        return f'{self.channel.epoch}-{sequence}'
+
+    def get(self, timeout):
+        """Wait up to ``timeout`` seconds and return new ``(sequence, event)`` pairs
+
+        Returns an empty list on timeout. If the subscriber fell further behind
+        than the channel buffer, or resumed from an id this channel cannot
+        replay, a single ``{'resync': True}`` event is returned so the client
+        can reload the full slot list.
+        """
+        channel = self.channel
+        with channel.condition:
+            if not self.resync and channel.sequence == self.cursor:
+                channel.condition.wait(timeout)
+            if not self.resync and channel.sequence == self.cursor:
+                return []
+            missed = channel.sequence - self.cursor
+            self.cursor = channel.sequence
+            if self.resync or missed > len(channel.events):
+                self.resync = False
+                return [(channel.sequence, {'resync': True})]
+            return list(channel.events)[-missed:]
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class SlotBroker:
+    """Fan-out of slot changes to subscribers keyed by (tenant, doctor_id, date)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, doctor_id, appointment_date, tenant=None, last_event_id=None):
+        key = (tenant or tenant_key(), int(doctor_id), appointment_date)
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = self._channels[key] = _Channel()
+            channel.subscribers += 1
+            return Subscription(self, key, channel, last_event_id)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            channel = self._channels.get(subscription.key)
+            if channel is subscription.channel:
+                channel.subscribers -= 1
+                if channel.subscribers <= 0:
+                    del self._channels[subscription.key]
+
+    def publish(self, doctor_id, appointment_date, event, tenant=None):
+        """Append ``event`` to the channel and wake its subscribers; returns the listener count"""
+        key = (tenant or tenant_key(), int(doctor_id), appointment_date)
+        with self._lock:
+            channel = self._channels.get(key)
+        if channel is None:
+            return 0
+        with channel.condition:
+            channel.sequence += 1
+            channel.events.append((channel.sequence, event))
+            channel.condition.notify_all()
+        return channel.subscribers
+
+    def subscriber_count(self, doctor_id=None, appointment_date=None, tenant=None):
+        with self._lock:
+            if doctor_id is None:
+                return sum(c.subscribers for c in self._channels.values())
+            channel = self._channels.get((tenant or tenant_key(), int(doctor_id), appointment_date))
+            return channel.subscribers if channel else 0
+
+
+broker = SlotBroker()
+
+
+def publish_slot_change(appointment, available):
+    """Announce that an appointment's slot was taken or freed"""
+    return broker.publish(appointment.doctor_id, appointment.appointment_date, {
+        'time': appointment.appointment_time.strftime('%H:%M'),
+        'available': available
+    })
+
+
+def cooperative_worker():
+    """True when threading is monkey-patched by gevent or eventlet"""
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('threading'):
+        return True
+    eventlet_patcher = sys.modules.get('eventlet.patcher')
+    return eventlet_patcher is not None and eventlet_patcher.is_monkey_patched('thread')
+
+
+def sse_enabled(setting):
+    """Resolve ``SSE_ENABLED`` ('auto', '1' or '0') for this process"""
+    setting = str(setting).lower()
+    if setting == 'auto':
+        return cooperative_worker()
+    return setting in ('1', 'true', 'yes', 'on')
+
+
+def format_sse(data, event=None, id=None):
+    """Encode one Server-Sent Events message"""
+    message = f'id: {id}\n' if id is not None else ''
+    if event:
+        message += f'event: {event}\n'
+    return message + f'data: {json.dumps(data)}\n\n'
+
+
+def stream_slot_events(doctor_id, appointment_date, heartbeat, max_duration,
+                       last_event_id=None):
+    """SSE stream for a (doctor, date) channel of the current tenant"""
+    return _stream(tenant_key(), doctor_id, appointment_date, heartbeat, max_duration,
+                   last_event_id)
+
+
+def _stream(tenant, doctor_id, appointment_date, heartbeat, max_duration,
+            last_event_id=None):
+    """Yield SSE messages for a channel until ``max_duration`` elapses
+
+    Subscribing happens on first iteration so a client that disconnects
+    before the stream starts never leaves a dangling subscriber. Comment
+    lines are sent every ``heartbeat`` seconds to keep proxies from closing
+    the idle connection. Ending the stream periodically lets EventSource
+    reconnect, which bounds how long a request is held open.
+    """
+    subscription = broker.subscribe(doctor_id, appointment_date, tenant=tenant,
+                                    last_event_id=last_event_id)
+    deadline = time.monotonic() + max_duration
+    try:
+        # Set the resume point even if no event arrives before the stream ends
+        yield f'retry: 3000\nid: {subscription.event_id(subscription.cursor)}\n\n'
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            events = subscription.get(timeout=min(heartbeat, remaining))
+            if not events:
+                yield ': keepalive\n\n'
+            for sequence, event in events:
+                yield format_sse(event, event='slot', id=subscription.event_id(sequence))
+    finally:
+        subscription.close()
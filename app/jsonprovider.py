@@ -0,0 +1,64 @@
+"""
+JSON serialization for responses and templates
+
+``JSON_PROVIDER`` selects the implementation: ``orjson`` (fast, needs the
+``orjson`` package), ``stdlib`` (Flask's default ``json`` module provider) or
+``auto`` (orjson when installed, stdlib otherwise). Both produce the same
+JSON for the types the app returns; dates still go through Flask's
+``default`` hook so they serialize exactly as before.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    def _options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # json.dumps-specific arguments (cls, separators...) need the stdlib
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        # Serialize straight to bytes, skipping the str round trip
+        body = orjson.dumps(obj, default=self.default,
+                            option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+PROVIDERS = {'stdlib': DefaultJSONProvider, 'orjson': OrjsonProvider}
+
+
+def provider_class(name):
+    if name == 'auto':
+        return OrjsonProvider if orjson is not None else DefaultJSONProvider
+    if name not in PROVIDERS:
+        raise ValueError(f'Unknown JSON_PROVIDER {name!r}; use auto, orjson or stdlib')
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER is orjson but the orjson package is not installed')
+    return PROVIDERS[name]
+
+
+def init_app(app):
+    """Install the JSON provider selected by ``JSON_PROVIDER``"""
+    app.json = provider_class(app.config.get('JSON_PROVIDER', 'auto'))(app)
@@ -3,8 +3,11 @@ Database models for the Easybook Hospital Appointment System
 """
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
 from app.database import db
+from app.phone import normalize_phone, reversed_digits
+from app.tenancy import qualify_user_id
 
 class User(UserMixin, db.Model):
     """User model for authentication (FR 1)"""
@@ -31,6 +34,10 @@ class User(UserMixin, db.Model):
         """Check if user is admin"""
         return self.role == 'admin'
     
+    def get_id(self):
+        """Login session id, qualified with the tenant the user belongs to"""
+        return qualify_user_id(self.id)
+    
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -43,6 +50,8 @@ class Patient(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     full_name = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(20), nullable=False)
+    phone_normalized = db.Column(db.String(20), index=True)  # +251XXXXXXXXX
+    phone_reversed = db.Column(db.String(20), index=True)  # digits reversed, for suffix lookups
     email = db.Column(db.String(120))
     date_of_birth = db.Column(db.Date)
     gender = db.Column(db.String(10))
@@ -53,6 +62,13 @@ class Patient(db.Model):
     # Relationships
     appointments = db.relationship('Appointment', backref='patient', lazy=True)
     
+    @validates('phone')
+    def _normalize_phone(self, key, phone):
+        """Keep the normalized phone columns in step with the typed number"""
+        self.phone_normalized = normalize_phone(phone)
+        self.phone_reversed = reversed_digits(self.phone_normalized)
+        return phone
+    
     def __repr__(self):
         return f'<Patient {self.full_name}>'
 
@@ -138,4 +154,29 @@ class Appointment(db.Model):
         import string
         timestamp = datetime.now().strftime('%Y%m%d')
         random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        return f'APT{timestamp}{random_str}'
\ No newline at end of file
+        return f'APT{timestamp}{random_str}'
+
+
+class OutboxMessage(db.Model):
+    """Pending notification written in the same transaction as the appointment change"""
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        db.Index('ix_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+        db.Index('ix_outbox_appointment_kind', 'appointment_id', 'kind'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # confirmation, cancellation, reminder
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, skipped, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # also the claim lease expiry
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    # Relationships
+    appointment = db.relationship('Appointment')
+    
+    def __repr__(self):
+        return f'<OutboxMessage {self.kind} Appointment:{self.appointment_id} {self.status}>'
@@ -0,0 +1,291 @@
+"""
+Appointment notifications via a transactional outbox
+
+Request handlers only add an ``OutboxMessage`` row in the same transaction as
+the appointment change, so no SMTP/SMS latency is added to a request and a
+message exists if and only if the change committed. A separate worker
+process (``flask --app run outbox-worker``) claims pending rows in batches,
+renders and sends them through a pluggable transport with bounded
+concurrency, and retries failures with exponential backoff.
+"""
+import json
+import os
+import random
+import signal
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+import click
+from sqlalchemy import insert, literal, select, update
+from app.database import db
+from app.models import Appointment, OutboxMessage
+from app.tenancy import DEFAULT_TENANT, find_tenant, tenant_context, tenant_option, tenant_settings
+
+# How long a claimed batch stays reserved before another worker may retry it
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def enqueue(appointment, kind):
+    """Add a notification for ``appointment`` to the current transaction"""
+    message = OutboxMessage(kind=kind, appointment=appointment, status='pending')
+    db.session.add(message)
+    return message
+
+
+def enqueue_many(appointment_ids, kind, now=None):
+    """Add one notification per appointment to the current transaction in a single INSERT"""
+    if not appointment_ids:
+        return 0
+    now = now or datetime.utcnow()
+    db.session.execute(insert(OutboxMessage.__table__), [
+        {'kind': kind, 'appointment_id': appointment_id, 'status': 'pending', 'attempts': 0,
+         'next_attempt_at': now, 'created_at': now}
+        for appointment_id in appointment_ids])
+    return len(appointment_ids)
+
+
+def enqueue_reminders(day, now=None):
+    """Queue reminders for every scheduled appointment on ``day`` with one INSERT ... SELECT
+
+    Appointments that already have a reminder are skipped, so running the
+    scheduler more than once a day is harmless. Returns the number queued.
+    """
+    now = now or datetime.utcnow()
+    outbox = OutboxMessage.__table__
+    already_queued = select(OutboxMessage.id).where(
+        OutboxMessage.appointment_id == Appointment.id,
+        OutboxMessage.kind == 'reminder'
+    ).exists()
+    source = select(
+        literal('reminder'), Appointment.id, literal('pending'), literal(0),
+        literal(now), literal(now)
+    ).where(
+        Appointment.appointment_date == day,
+        Appointment.status == 'scheduled',
+        ~already_queued
+    )
+    result = db.session.execute(insert(outbox).from_select(
+        ['kind', 'appointment_id', 'status', 'attempts', 'next_attempt_at', 'created_at'],
+        source))
+    db.session.commit()
+    return result.rowcount
+
+
+# ============= TRANSPORTS =============
+
+class FileTransport:
+    """Append each message as a JSON line to a local file (development stand-in)
+
+    Messages carry patient names and contact details, so the file is created
+    readable by its owner only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, message):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        with open(fd, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(dict(message, sent_at=datetime.utcnow().isoformat())) + '\n')
+
+
+class SMTPTransport:
+    """Send email through an SMTP server
+
+    Pointed at a local debugging server (``python -m aiosmtpd -n -l localhost:1025``)
+    it prints messages instead of delivering them. Messages without an email
+    address have no SMS gateway here and are rejected so they surface as failures.
+    """
+
+    def __init__(self, host, port, sender, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.timeout = timeout
+
+    def send(self, message):
+        if message['channel'] != 'email':
+            raise RuntimeError(f"SMTP transport cannot deliver {message['channel']} messages")
+        email = EmailMessage()
+        email['From'] = self.sender
+        email['To'] = message['to']
+        email['Subject'] = message['subject']
+        email.set_content(message['body'])
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(email)
+
+
+def build_transport(config):
+    """Create the transport named by ``NOTIFY_TRANSPORT``"""
+    name = config['NOTIFY_TRANSPORT']
+    if name == 'file':
+        return FileTransport(config['NOTIFY_FILE_PATH'])
+    if name == 'smtp':
+        return SMTPTransport(config['SMTP_HOST'], config['SMTP_PORT'], config['SMTP_SENDER'])
+    raise ValueError(f'Unknown NOTIFY_TRANSPORT: {name}')
+
+
+# ============= WORKER =============
+
+def render(message, hospital_name):
+    """Build the outgoing message, or None if it no longer applies"""
+    appointment = message.appointment
+    if message.kind == 'reminder' and appointment.status != 'scheduled':
+        return None
+
+    patient = appointment.patient
+    when = f"{appointment.appointment_date.strftime('%A, %b %d, %Y')} at " \
+           f"{appointment.appointment_time.strftime('%I:%M %p')}"
+    subjects = {
+        'confirmation': 'Appointment confirmed',
+        'cancellation': 'Appointment cancelled',
+        'reminder': 'Appointment reminder',
+    }
+    bodies = {
+        'confirmation': f'Your appointment with {appointment.doctor.name} on {when} is confirmed.',
+        'cancellation': f'Your appointment with {appointment.doctor.name} on {when} has been cancelled.',
+        'reminder': f'Reminder: you have an appointment with {appointment.doctor.name} tomorrow, {when}. '
+                    'Please arrive 15 minutes early.',
+    }
+    return {
+        'id': message.id,
+        'kind': message.kind,
+        'channel': 'email' if patient.email else 'sms',
+        'to': patient.email or patient.phone,
+        'subject': f'{subjects[message.kind]} - {appointment.reference_number}',
+        'body': f'Dear {patient.full_name},\n\n{bodies[message.kind]}\n\n'
+                f'Reference: {appointment.reference_number}\n{hospital_name}',
+    }
+
+
+def backoff_delay(attempts, base_seconds=30, cap_seconds=3600):
+    """Exponential backoff with full jitter"""
+    return timedelta(seconds=random.uniform(0, min(cap_seconds, base_seconds * 2 ** (attempts - 1))))
+
+
+def claim_batch(batch_size, now=None):
+    """Reserve up to ``batch_size`` due messages for this worker
+
+    Claiming moves ``next_attempt_at`` forward by the lease, so rows left in
+    ``sending`` by a crashed worker become due again once it expires. The
+    UPDATE repeats the due condition and only the rows it returns are sent:
+    without ``SKIP LOCKED`` (SQLite) another worker may claim a selected row
+    first, and that row is then no longer due.
+    """
+    now = now or datetime.utcnow()
+    due = (OutboxMessage.status.in_(['pending', 'sending']),
+           OutboxMessage.next_attempt_at <= now)
+    query = select(OutboxMessage.id).where(*due).order_by(
+        OutboxMessage.next_attempt_at).limit(batch_size)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        query = query.with_for_update(skip_locked=True)
+    ids = db.session.execute(query).scalars().all()
+    if not ids:
+        db.session.commit()
+        return []
+
+    claimed = db.session.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(ids), *due)
+        .values(status='sending', next_attempt_at=now + CLAIM_LEASE)
+        .returning(OutboxMessage.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    if not claimed:
+        return []
+    return OutboxMessage.query.filter(OutboxMessage.id.in_(claimed)).options(
+        db.joinedload(OutboxMessage.appointment).joinedload(Appointment.patient),
+        db.joinedload(OutboxMessage.appointment).joinedload(Appointment.doctor)
+    ).all()
+
+
+def drain_once(transport, executor, batch_size, max_attempts, hospital_name):
+    """Claim, send and record one batch; returns the number of messages handled"""
+    messages = claim_batch(batch_size)
+    if not messages:
+        return 0
+
+    rendered = {m.id: render(m, hospital_name) for m in messages}
+    futures = {m.id: executor.submit(transport.send, rendered[m.id])
+               for m in messages if rendered[m.id] is not None}
+
+    now = datetime.utcnow()
+    for message in messages:
+        if message.id not in futures:
+            message.status = 'skipped'
+            continue
+        try:
+            futures[message.id].result()
+        except Exception as e:
+            message.attempts += 1
+            message.last_error = f'{type(e).__name__}: {e}'
+            if message.attempts >= max_attempts:
+                message.status = 'failed'
+            else:
+                message.status = 'pending'
+                message.next_attempt_at = now + backoff_delay(message.attempts)
+        else:
+            message.status = 'sent'
+            message.sent_at = now
+    db.session.commit()
+    return len(messages)
+
+
+def run_worker(app, once=False, tenant=DEFAULT_TENANT):
+    """Drain the outbox until stopped (SIGINT/SIGTERM) or, with ``once``, until empty
+
+    One worker serves one tenant's outbox, sending with that tenant's settings.
+    """
+    config = tenant_settings(app, find_tenant(app, tenant))
+    transport = build_transport(config)
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    with ThreadPoolExecutor(max_workers=config['OUTBOX_CONCURRENCY']) as executor:
+        while not stopping:
+            with tenant_context(app, tenant):
+                handled = drain_once(transport, executor,
+                                     batch_size=config['OUTBOX_BATCH_SIZE'],
+                                     max_attempts=config['OUTBOX_MAX_ATTEMPTS'],
+                                     hospital_name=config['HOSPITAL_NAME'])
+            if handled:
+                print(f'Processed {handled} outbox messages.')
+            elif once:
+                break
+            else:
+                time.sleep(config['OUTBOX_POLL_SECONDS'])
+
+
+def init_app(app):
+    """Register the outbox worker and reminder scheduler CLI commands"""
+    if not app.config.get('NOTIFY_FILE_PATH'):
+        app.config['NOTIFY_FILE_PATH'] = os.path.join(app.instance_path, 'notifications.log')
+
+    @app.cli.command('outbox-worker')
+    @click.option('--once', is_flag=True, help='Exit when no messages are due.')
+    @tenant_option
+    def outbox_worker(once, tenant):
+        """Send queued appointment notifications"""
+        run_worker(app, once=once, tenant=tenant)
+
+    @app.cli.command('enqueue-reminders')
+    @click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='Appointment date to remind about (default: tomorrow).')
+    @tenant_option
+    def enqueue_reminders_command(day, tenant):
+        """Queue reminders for the next day's scheduled appointments"""
+        day = day.date() if day else date.today() + timedelta(days=1)
+        with tenant_context(app, tenant):
+            count = enqueue_reminders(day)
+        print(f'Queued {count} reminders for {day.isoformat()}.')
@@ -0,0 +1,119 @@
+"""
+Phone number normalization and indexed lookup helpers
+
+Numbers are stored as typed in ``Patient.phone``. Alongside it we keep the
+number normalized to ``+251...`` form (mirroring ``formatPhone`` in main.js)
+for exact lookups, and its digits reversed so a suffix search becomes an
+index range scan instead of a ``LIKE '%...'`` table scan.
+"""
+import re
+import click
+from app.tenancy import current_engine, tenant_context, tenant_option
+
+COUNTRY_CODE = '251'
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def digits_only(phone):
+    """Strip everything but digits"""
+    return _NON_DIGITS.sub('', phone or '')
+
+
+def normalize_phone(phone):
+    """Normalize a phone number the same way the browser formats it
+
+    ``0911 234 567``, ``251911234567`` and ``+251-911-234-567`` all become
+    ``+251911234567``. Returns None for input without digits.
+    """
+    digits = digits_only(phone)
+    if not digits:
+        return None
+    if digits.startswith(COUNTRY_CODE):
+        return '+' + digits
+    if digits.startswith('0'):
+        return '+' + COUNTRY_CODE + digits[1:]
+    if len(digits) == 9 and digits[0] in '79':
+        # Local mobile number typed without the leading zero
+        return '+' + COUNTRY_CODE + digits
+    return '+' + digits if (phone or '').strip().startswith('+') else digits
+
+
+def reversed_digits(phone):
+    """Reverse the digits of a normalized number for suffix lookups"""
+    digits = digits_only(phone)
+    return digits[::-1] if digits else None
+
+
+def suffix_range(suffix):
+    """Return ``(low, high)`` bounds matching every reversed number ending in ``suffix``
+
+    ``high`` is ``low`` with its last non-nine digit incremented (``4399`` ->
+    ``44``). Both bounds are digit strings, which sort the same under every
+    collation, unlike a punctuation sentinel. ``high`` is None when ``low``
+    is all nines and the range has no upper bound.
+    """
+    low = digits_only(suffix)[::-1]
+    head = low.rstrip('9')
+    if not head:
+        return low, None
+    return low, head[:-1] + str(int(head[-1]) + 1)
+
+
+def init_app(app):
+    """Register the phone backfill CLI command"""
+
+    @app.cli.command('phone-backfill')
+    @click.option('--batch-size', default=1000, show_default=True,
+                  help='Rows updated per transaction.')
+    @tenant_option
+    def phone_backfill(batch_size, tenant):
+        """Add normalized phone columns if missing and fill them for existing patients"""
+        from sqlalchemy import bindparam, inspect, text
+        from app.database import db
+        from app.models import Patient
+
+        with tenant_context(app, tenant):
+            engine = current_engine()
+            table = Patient.__table__
+            with engine.begin() as connection:
+                existing = {c['name'] for c in inspect(connection).get_columns(table.name)}
+                for column in ('phone_normalized', 'phone_reversed'):
+                    if column not in existing:
+                        connection.execute(text(
+                            f'ALTER TABLE {table.name} ADD COLUMN {column} VARCHAR(20)'))
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+
+            update = table.update().where(table.c.id == bindparam('row_id')).values(
+                phone_normalized=bindparam('normalized'),
+                phone_reversed=bindparam('reversed'))
+
+            last_id = 0
+            total = 0
+            while True:
+                with engine.begin() as connection:
+                    rows = connection.execute(
+                        db.select(table.c.id, table.c.phone)
+                        .where(table.c.id > last_id)
+                        .order_by(table.c.id)
+                        .limit(batch_size)).all()
+                    if not rows:
+                        break
+                    params = []
+                    for row in rows:
+                        normalized = normalize_phone(row.phone)
+                        params.append({'row_id': row.id, 'normalized': normalized,
+                                       'reversed': reversed_digits(normalized)})
+                    connection.execute(update, params)
+                last_id = rows[-1].id
+                total += len(rows)
+                print(f'Backfilled {total} patients...')
+
+            # The UPDATEs above bypass the ORM hooks that keep the search index in step
+            from app import search
+            with engine.begin() as connection:
+                if search.reindex(connection):
+                    print('Search index rebuilt.')
+
+        print(f'Done. {total} patients backfilled.')
@@ -0,0 +1,188 @@
+"""
+Admission control for expensive endpoints
+
+Two independent guards, configured per endpoint:
+
+- a token bucket keyed by client (logged-in user, else IP) and endpoint.
+  Buckets live in a small SQLite file by default so the limit holds across
+  all gunicorn workers on the host; an in-memory store is available for
+  single-process use.
+- a cap on requests in flight for the endpoint in this worker. Requests
+  over the cap are shed immediately with 429 instead of queueing behind a
+  saturated worker.
+
+Both answer with ``429 Too Many Requests`` and a ``Retry-After`` header.
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from flask import Response, g, jsonify, request, session
+from app.tenancy import cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStore:
+    """Token buckets held in this process only"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key, rate, burst, now=None):
+        """Take one token; returns ``(allowed, retry_after_seconds)``"""
+        now = now or time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+class SQLiteStore:
+    """Token buckets in a SQLite file shared by every worker process on the host
+
+    ``timeout`` is how long a call waits for another worker's lock. It is kept
+    short because the wait blocks the whole process under gevent; a call
+    that cannot get the lock in time admits the request (fails open).
+    """
+
+    PRUNE_EVERY = 1000  # calls between deletions of idle buckets
+
+    def __init__(self, path, timeout=0.1):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._calls = 0
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS buckets '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, rate, burst, now=None):
+        """Take one token; returns ``(allowed, retry_after_seconds)``"""
+        now = now or time.time()
+        try:
+            return self._take(key, rate, burst, now)
+        except sqlite3.OperationalError as e:
+            # Locked or unavailable store: admit rather than fail the request
+            logger.warning('Rate limit store %s unavailable, admitting request: %s', self.path, e)
+            return True, 0
+
+    def _take(self, key, rate, burst, now):
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            connection.execute(
+                'INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens, now))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        self._calls += 1
+        if self._calls % self.PRUNE_EVERY == 0:
+            # A bucket idle this long has refilled completely; dropping it is lossless
+            connection.execute('DELETE FROM buckets WHERE updated < ?', (now - 3600,))
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+def build_store(config):
+    if config['RATELIMIT_STORAGE'] == 'memory':
+        return MemoryStore()
+    path = config['RATELIMIT_STORAGE_PATH']
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return SQLiteStore(path, timeout=config.get('RATELIMIT_STORAGE_TIMEOUT', 0.1))
+
+
+def client_identity():
+    """Logged-in user id if any (read from the session, no DB query), else the client IP"""
+    user_id = session.get('_user_id')
+    return f'user:{user_id}' if user_id else f'ip:{request.remote_addr}'
+
+
+def too_many_requests(retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': 'Too many requests', 'retry_after': retry_after})
+        response.status_code = 429
+    else:
+        response = Response('Too many requests. Please try again shortly.', status=429,
+                            mimetype='text/plain')
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def init_app(app):
+    """Install rate limits and concurrency caps from ``RATELIMIT_RULES``"""
+    rules = app.config.get('RATELIMIT_RULES') or {}
+    if not app.config.get('RATELIMIT_ENABLED') or not rules:
+        return
+
+    store = build_store(app.config)
+    semaphores = {endpoint: threading.BoundedSemaphore(rule['max_concurrent'])
+                  for endpoint, rule in rules.items() if rule.get('max_concurrent')}
+    # Clients already refused are refused again from memory until their
+    # Retry-After passes, so a flood costs no store writes
+    penalty_box = {}
+    app.extensions['ratelimit'] = store
+
+    @app.before_request
+    def admit_request():
+        rule = rules.get(request.endpoint)
+        if rule is None or request.method not in rule.get('methods', ('GET', 'POST')):
+            return None
+
+        if rule.get('per_minute'):
+            key = cache_key('rl', request.endpoint, client_identity())
+            now = time.time()
+            blocked_until = penalty_box.get(key)
+            if blocked_until is not None:
+                if blocked_until > now:
+                    return too_many_requests(blocked_until - now)
+                penalty_box.pop(key, None)
+            allowed, retry_after = store.take(key, rule['per_minute'] / 60.0,
+                                              rule.get('burst', rule['per_minute']), now=now)
+            if not allowed:
+                if len(penalty_box) > 10000:
+                    penalty_box.clear()
+                penalty_box[key] = now + retry_after
+                return too_many_requests(retry_after)
+
+        semaphore = semaphores.get(request.endpoint)
+        if semaphore is not None:
+            if not semaphore.acquire(blocking=False):
+                return too_many_requests(1)
+            g.ratelimit_semaphore = semaphore
+        return None
+
+    @app.teardown_request
+    def release_concurrency_slot(exc):
+        semaphore = g.pop('ratelimit_semaphore', None)
+        if semaphore is not None:
+            semaphore.release()
@@ -0,0 +1,159 @@
+"""
+Read/write splitting across the primary database and read replicas
+
+Replica URLs come from ``READ_REPLICA_URLS`` and are registered as
+``SQLALCHEMY_BINDS`` named ``replica_1``, ``replica_2``... For each GET/HEAD
+request a healthy replica is picked and handed to ``RoutingSession`` through
+``g``; every other request, and every request from a client that wrote in the
+last ``REPLICA_STICKY_SECONDS``, reads from the primary (read-your-writes).
+Requests served for a tenant database (``app.tenancy``) always use it directly.
+
+Replica health is a lag guard: ``replica-sync`` stamps a heartbeat row on the
+primary, and a replica whose copy of that row is older than
+``REPLICA_MAX_LAG_SECONDS`` is skipped in favour of the primary.
+"""
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import click
+from flask import g, has_app_context, request, session
+from sqlalchemy import make_url
+from app.database import db
+
+heartbeat = db.Table(
+    'replication_heartbeat',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('updated_at', db.DateTime, nullable=False),
+)
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_lag_lock = threading.Lock()
+_lag_cache = {}  # bind key -> (checked_at, lag seconds or None)
+
+
+def replica_keys(app):
+    return [key for key in app.config.get('SQLALCHEMY_BINDS', {}) if key.startswith('replica_')]
+
+
+def replica_lag(engine):
+    """Seconds since the heartbeat seen by ``engine`` was written, or None if unknown"""
+    try:
+        with engine.connect() as connection:
+            stamp = connection.execute(
+                db.select(heartbeat.c.updated_at).where(heartbeat.c.id == 1)).scalar()
+    except Exception:
+        return None
+    if stamp is None:
+        return None
+    return (datetime.utcnow() - stamp).total_seconds()
+
+
+def _cached_lag(app, key):
+    now = time.monotonic()
+    with _lag_lock:
+        checked = _lag_cache.get(key)
+    if checked and now - checked[0] < app.config['REPLICA_LAG_CHECK_SECONDS']:
+        return checked[1]
+    lag = replica_lag(db.engines[key])
+    with _lag_lock:
+        _lag_cache[key] = (now, lag)
+    return lag
+
+
+def healthy_replicas(app):
+    """Bind keys of replicas within the allowed lag"""
+    max_lag = app.config['REPLICA_MAX_LAG_SECONDS']
+    healthy = []
+    for key in replica_keys(app):
+        lag = _cached_lag(app, key)
+        if lag is not None and lag <= max_lag:
+            healthy.append(key)
+    return healthy
+
+
+def _choose_engine(app):
+    """Pick the replica engine for this request, or None to use the primary"""
+    if request.method not in READ_METHODS or g.get('tenant') is not None:
+        return None
+    if session.get('db_primary_until', 0) > time.time():
+        return None
+    keys = healthy_replicas(app)
+    return db.engines[random.choice(keys)] if keys else None
+
+
+@contextmanager
+def reading_from_primary():
+    """Send the current request's reads to the primary inside the block"""
+    if not has_app_context():
+        yield
+        return
+    replica = g.pop('db_replica', None)
+    try:
+        yield
+    finally:
+        if replica is not None:
+            g.db_replica = replica
+
+
+def write_heartbeat(connection):
+    """Stamp the primary with the current time for replica lag checks"""
+    now = datetime.utcnow()
+    updated = connection.execute(
+        heartbeat.update().where(heartbeat.c.id == 1).values(updated_at=now)).rowcount
+    if not updated:
+        connection.execute(heartbeat.insert().values(id=1, updated_at=now))
+
+
+def sync_sqlite_replicas(primary_url, replica_urls):
+    """Copy the primary SQLite file onto each replica with the online backup API"""
+    source = sqlite3.connect(make_url(primary_url).database)
+    try:
+        for url in replica_urls:
+            target = sqlite3.connect(make_url(url).database)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+
+
+def init_app(app):
+    """Install per-request replica selection and the replica-sync command"""
+    if replica_keys(app):
+        @app.before_request
+        def select_read_replica():
+            g.db_replica = _choose_engine(app)
+
+        @app.after_request
+        def stick_to_primary_after_write(response):
+            if g.get('db_wrote'):
+                session['db_primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+            return response
+
+    @app.cli.command('replica-sync')
+    @click.option('--interval', default=1.0, show_default=True,
+                  help='Seconds between syncs.')
+    @click.option('--once', is_flag=True, help='Sync once and exit.')
+    def replica_sync(interval, once):
+        """Write the replication heartbeat and, for SQLite, copy the primary to the replicas
+
+        With databases that replicate natively this only keeps the heartbeat
+        fresh so the lag guard works.
+        """
+        primary_url = app.config['SQLALCHEMY_DATABASE_URI']
+        replica_urls = [app.config['SQLALCHEMY_BINDS'][key] for key in replica_keys(app)]
+        copy_files = make_url(primary_url).get_backend_name() == 'sqlite'
+        while True:
+            with app.app_context():
+                with db.engine.begin() as connection:
+                    write_heartbeat(connection)
+            if copy_files and replica_urls:
+                sync_sqlite_replicas(primary_url, replica_urls)
+            if once:
+                break
+            time.sleep(interval)
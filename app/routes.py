@@ -3,12 +3,18 @@ Application routes and views
 This file contains all the routes for the Easybook system
 """
 from datetime import datetime, date, time, timedelta
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, Response, current_app, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from app.database import db
 from app.models import User, Patient, Specialty, Doctor, Schedule, Appointment
 from app.auth import admin_required, patient_required
-from config import Config
+from app import search
+from app.events import publish_slot_change, sse_enabled, stream_slot_events
+from app import notifications
+from app.tenancy import tenant_setting
+from app.cache import memoize, invalidate
+from app.phone import normalize_phone, digits_only, suffix_range
+from app import bulk
 
 main = Blueprint('main', __name__)
 
@@ -17,12 +23,12 @@ main = Blueprint('main', __name__)
 @main.route('/')
 def index():
     """Landing page (FR 7)"""
-    specialties = Specialty.query.all()
+    # Queried only when the cached fragment needs re-rendering
     return render_template('index.html', 
-                         hospital_name=Config.HOSPITAL_NAME,
-                         operating_hours=Config.HOSPITAL_OPERATING_HOURS,
-                         services=Config.HOSPITAL_SERVICES,
-                         specialties=specialties)
+                         hospital_name=tenant_setting('HOSPITAL_NAME'),
+                         operating_hours=tenant_setting('HOSPITAL_OPERATING_HOURS'),
+                         services=tenant_setting('HOSPITAL_SERVICES'),
+                         specialties=Specialty.query)
 
 @main.route('/login', methods=['GET', 'POST'])
 def login():
@@ -239,14 +245,18 @@ def book_appointment():
             status='scheduled'
         )
         db.session.add(appointment)
+        notifications.enqueue(appointment, 'confirmation')
         db.session.commit()
+        publish_slot_change(appointment, available=False)
         
         flash(f'Appointment booked successfully! Reference: {appointment.reference_number}', 'success')
         return redirect(url_for('main.patient_dashboard'))
     
-    # GET request - show booking form
-    specialties = Specialty.query.all()
-    return render_template('book_appointment.html', specialties=specialties)
+    # GET request - show booking form with everything the form needs inlined;
+    # the template calls the builder only when its cached fragments are stale
+    return render_template('book_appointment.html', booking_bootstrap=build_booking_bootstrap,
+                           live_slots=sse_enabled(current_app.config['SSE_ENABLED']),
+                           slot_poll_seconds=current_app.config['SLOT_POLL_SECONDS'])
 
 @main.route('/cancel-appointment/<int:appointment_id>', methods=['POST'])
 @login_required
@@ -268,53 +278,161 @@ def cancel_appointment(appointment_id):
     
     appointment.status = 'cancelled'
     appointment.updated_at = datetime.utcnow()
+    notifications.enqueue(appointment, 'cancellation')
     db.session.commit()
+    publish_slot_change(appointment, available=True)
     
     flash('Appointment cancelled successfully.', 'info')
     return redirect(url_for('main.patient_dashboard'))
 
 # ============= API ROUTES =============
 
+def build_booking_bootstrap():
+    """Booking form data, shared across workers until doctors, schedules or specialties change"""
+    return memoize('booking-bootstrap', _query_booking_bootstrap,
+                   depends_on=('specialties', 'doctors', 'schedules'))
+
+def _query_booking_bootstrap():
+    """Collect specialties, active doctors and their weekly schedules in three queries"""
+    specialties = Specialty.query.order_by(Specialty.name).all()
+    doctors = Doctor.query.filter_by(is_active=True).order_by(Doctor.name).all()
+    schedules = Schedule.query.join(Doctor).filter(
+        Schedule.is_active == True,
+        Doctor.is_active == True
+    ).order_by(Schedule.doctor_id, Schedule.start_time).all()
+    
+    doctors_by_specialty = {}
+    for d in doctors:
+        doctors_by_specialty.setdefault(str(d.specialty_id), []).append({
+            'id': d.id,
+            'name': d.name,
+            'qualification': d.qualification,
+            'experience_years': d.experience_years
+        })
+    
+    weekly_schedules = {}
+    for schedule in schedules:
+        days = weekly_schedules.setdefault(str(schedule.doctor_id), {})
+        days.setdefault(schedule.day_of_week, []).append({
+            'start_time': schedule.start_time.strftime('%H:%M'),
+            'end_time': schedule.end_time.strftime('%H:%M'),
+            'slot_duration': schedule.slot_duration
+        })
+    
+    return {
+        'specialties': [{'id': s.id, 'name': s.name} for s in specialties],
+        'doctors_by_specialty': doctors_by_specialty,
+        'schedules': weekly_schedules
+    }
+
+@main.route('/api/booking-bootstrap')
+def get_booking_bootstrap():
+    """Everything the booking form needs in a single payload (FR 2)"""
+    return jsonify(build_booking_bootstrap())
+
 @main.route('/api/doctors/<int:specialty_id>')
 def get_doctors_by_specialty(specialty_id):
     """Get doctors by specialty (FR 2.1)"""
-    doctors = Doctor.query.filter_by(specialty_id=specialty_id, is_active=True).all()
-    return jsonify([{
-        'id': d.id,
-        'name': d.name,
-        'qualification': d.qualification,
-        'experience_years': d.experience_years
-    } for d in doctors])
+    def query_doctors():
+        doctors = Doctor.query.filter_by(specialty_id=specialty_id, is_active=True).all()
+        return [{
+            'id': d.id,
+            'name': d.name,
+            'qualification': d.qualification,
+            'experience_years': d.experience_years
+        } for d in doctors]
+    
+    return jsonify(memoize(f'doctors:{specialty_id}', query_doctors, depends_on=('doctors',)))
 
 @main.route('/api/doctor-availability/<int:doctor_id>')
 def get_doctor_availability(doctor_id):
     """Get doctor's available slots (FR 2.2)"""
     doctor = Doctor.query.get_or_404(doctor_id)
-    schedules = Schedule.query.filter_by(doctor_id=doctor_id, is_active=True).all()
     
-    # Group by day
-    availability = {}
-    for schedule in schedules:
-        day = schedule.day_of_week
-        if day not in availability:
-            availability[day] = []
+    def query_availability():
+        schedules = Schedule.query.filter_by(doctor_id=doctor_id, is_active=True).all()
         
-        availability[day].append({
-            'start_time': schedule.start_time.strftime('%H:%M'),
-            'end_time': schedule.end_time.strftime('%H:%M'),
-            'slot_duration': schedule.slot_duration
-        })
-    
-    return jsonify(availability)
+        # Group by day
+        availability = {}
+        for schedule in schedules:
+            day = schedule.day_of_week
+            if day not in availability:
+                availability[day] = []
+            
+            availability[day].append({
+                'start_time': schedule.start_time.strftime('%H:%M'),
+                'end_time': schedule.end_time.strftime('%H:%M'),
+                'slot_duration': schedule.slot_duration
+            })
+        return availability
+    
+    return jsonify(memoize(f'availability:{doctor_id}', query_availability,
+                           depends_on=('schedules',)))
+
+MAX_AVAILABILITY_DAYS = 14
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+def _free_runs(start, end, step, booked):
+    """Lengths of alternating runs of free and booked slots, starting with free"""
+    runs = [0]
+    free = True
+    for minute in range(start, end, step):
+        if (minute not in booked) != free:
+            runs.append(0)
+            free = not free
+        runs[-1] += 1
+    return runs
+
+def compact_availability(doctor_id, start_date, days):
+    """Free slots for ``days`` days from ``start_date``, run-length encoded
+
+    ``days`` holds one list per date of ``[start_minute, step, runs]`` blocks,
+    one per schedule: slot ``i`` of a block starts ``start_minute + i * step``
+    minutes after midnight, and ``runs`` alternates counts of free and booked
+    slots, beginning with free (``[3, 1, 12]``: 3 free, 1 booked, 12 free).
+    """
+    schedules = {}
+    for schedule in Schedule.query.filter_by(doctor_id=doctor_id, is_active=True).order_by(
+            Schedule.start_time):
+        schedules.setdefault(schedule.day_of_week, []).append(schedule)
+
+    end_date = start_date + timedelta(days=days - 1)
+    booked = {}
+    for appointment_date, appointment_time in db.session.query(
+            Appointment.appointment_date, Appointment.appointment_time).filter(
+            Appointment.doctor_id == doctor_id,
+            Appointment.appointment_date.between(start_date, end_date),
+            Appointment.status == 'scheduled'):
+        booked.setdefault(appointment_date, set()).add(_minutes(appointment_time))
+
+    encoded = []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        taken = booked.get(day, set())
+        encoded.append([[_minutes(s.start_time), s.slot_duration,
+                         _free_runs(_minutes(s.start_time), _minutes(s.end_time),
+                                    s.slot_duration, taken)]
+                        for s in schedules.get(day.strftime('%A'), ())])
+    return {'start': start_date.isoformat(), 'days': encoded}
 
 @main.route('/api/available-slots/<int:doctor_id>/<date_str>')
 def get_available_slots(doctor_id, date_str):
-    """Get available time slots for a specific date"""
+    """Get available time slots for a specific date
+
+    ``?format=compact&days=N`` returns ``N`` days (up to 14) from the date in
+    the run-length format of ``compact_availability``.
+    """
     try:
         appointment_date = datetime.strptime(date_str, '%Y-%m-%d').date()
     except ValueError:
         return jsonify({'error': 'Invalid date format'}), 400
     
+    if request.args.get('format') == 'compact':
+        days = min(max(request.args.get('days', 1, type=int), 1), MAX_AVAILABILITY_DAYS)
+        return jsonify(compact_availability(doctor_id, appointment_date, days))
+    
     # Get day of week
     day_name = appointment_date.strftime('%A')
     
@@ -328,28 +446,101 @@ def get_available_slots(doctor_id, date_str):
     if not schedules:
         return jsonify([])
     
-    # Get booked appointments for this date
-    booked = Appointment.query.filter_by(
+    # Get booked appointment times for this date
+    booked = {_minutes(t) for (t,) in db.session.query(Appointment.appointment_time).filter_by(
         doctor_id=doctor_id,
         appointment_date=appointment_date,
         status='scheduled'
-    ).all()
-    booked_times = [a.appointment_time for a in booked]
+    )}
     
-    # Generate available slots
+    # Generate available slots, working in minutes rather than datetimes
     available_slots = []
     for schedule in schedules:
-        current_time = datetime.combine(date.today(), schedule.start_time)
-        end_time = datetime.combine(date.today(), schedule.end_time)
-        
-        while current_time < end_time:
-            slot_time = current_time.time()
-            if slot_time not in booked_times:
-                available_slots.append(slot_time.strftime('%H:%M'))
-            current_time += timedelta(minutes=schedule.slot_duration)
+        for minute in range(_minutes(schedule.start_time), _minutes(schedule.end_time),
+                            schedule.slot_duration):
+            if minute not in booked:
+                available_slots.append(f'{minute // 60:02d}:{minute % 60:02d}')
     
     return jsonify(available_slots)
 
+@main.route('/api/search')
+@login_required
+@admin_required
+def api_search():
+    """Search patients, doctors and appointments by name, phone, email or reference"""
+    query = request.args.get('q', '').strip()
+    kinds = request.args.getlist('type') or None
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    
+    results, has_more = search.search(query, kinds=kinds, page=page, per_page=per_page)
+    return jsonify({
+        'query': query,
+        'page': page,
+        'per_page': per_page,
+        'has_more': has_more,
+        'results': results
+    })
+
+@main.route('/api/patients/by-phone')
+@login_required
+@admin_required
+def lookup_patient_by_phone():
+    """Front-desk lookup of patients by phone number
+
+    Tries an exact match on the normalized number first, then falls back to
+    matching the trailing digits (at least 4) through the reversed-digit index.
+    """
+    phone = request.args.get('phone', '').strip()
+    if not digits_only(phone):
+        return jsonify({'error': 'Phone number required'}), 400
+    
+    patients = Patient.query.filter_by(
+        phone_normalized=normalize_phone(phone)
+    ).limit(20).all()
+    match = 'exact'
+    
+    if not patients and len(digits_only(phone)) >= 4:
+        low, high = suffix_range(phone)
+        criteria = [Patient.phone_reversed >= low]
+        if high is not None:
+            criteria.append(Patient.phone_reversed < high)
+        patients = Patient.query.filter(*criteria).limit(20).all()
+        match = 'suffix'
+    
+    return jsonify({
+        'match': match if patients else None,
+        'results': [{
+            'id': p.id,
+            'full_name': p.full_name,
+            'phone': p.phone,
+            'phone_normalized': p.phone_normalized,
+            'email': p.email
+        } for p in patients]
+    })
+
+@main.route('/api/slot-events/<int:doctor_id>/<date_str>')
+def slot_events(doctor_id, date_str):
+    """Stream slot bookings/cancellations for a doctor and date (Server-Sent Events)"""
+    if not sse_enabled(current_app.config['SSE_ENABLED']):
+        # A held-open stream would block a sync worker; 204 stops EventSource reconnecting
+        return '', 204
+    
+    try:
+        appointment_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Invalid date format'}), 400
+    
+    # The generator runs outside the request context and never touches the DB
+    stream = stream_slot_events(doctor_id, appointment_date,
+                                heartbeat=current_app.config['SSE_HEARTBEAT_SECONDS'],
+                                max_duration=current_app.config['SSE_MAX_STREAM_SECONDS'],
+                                last_event_id=request.headers.get('Last-Event-ID'))
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # ============= ADMIN ROUTES =============
 
 @main.route('/admin/dashboard')
@@ -399,6 +590,7 @@ def admin_doctors():
             )
             db.session.add(doctor)
             db.session.commit()
+            invalidate('doctors')
             flash('Doctor added successfully!', 'success')
         
         elif action == 'edit':
@@ -412,15 +604,20 @@ def admin_doctors():
                 doctor.phone = request.form.get('phone')
                 doctor.email = request.form.get('email')
                 db.session.commit()
+                invalidate('doctors')
                 flash('Doctor updated successfully!', 'success')
         
         elif action == 'delete':
-            doctor_id = request.form.get('doctor_id')
-            doctor = Doctor.query.get(doctor_id)
-            if doctor:
-                doctor.is_active = False
-                db.session.commit()
-                flash('Doctor deactivated successfully!', 'success')
+            # deactivate_doctor invalidates the doctor and schedule caches itself
+            counts = bulk.deactivate_doctor(request.form.get('doctor_id', type=int))
+            cleanup = (f"{counts['schedules']} schedule(s) deactivated and "
+                       f"{counts['cancelled']} upcoming appointment(s) cancelled.")
+            if counts['doctors']:
+                flash(f'Doctor deactivated successfully! {cleanup}', 'success')
+            elif counts['schedules'] or counts['cancelled']:
+                flash(f'Doctor was already inactive; {cleanup}', 'info')
+            else:
+                flash('Doctor is already inactive.', 'info')
         
         return redirect(url_for('main.admin_doctors'))
     
@@ -447,6 +644,7 @@ def admin_schedules():
             db.session.add(schedule)
             db.session.commit()
             flash('Schedule added successfully!', 'success')
+            invalidate('schedules')
         
         return redirect(url_for('main.admin_schedules'))
     
@@ -465,8 +663,46 @@ def admin_appointments():
         Appointment.appointment_date.desc(),
         Appointment.appointment_time.desc()
     ).all()
+    doctors = Doctor.query.order_by(Doctor.name).all()
+    
+    return render_template('admin_appointments.html', appointments=appointments, doctors=doctors)
+
+@main.route('/admin/appointments/bulk', methods=['POST'])
+@login_required
+@admin_required
+def admin_appointments_bulk():
+    """Bulk appointment actions; answers with affected counts as JSON when asked for JSON"""
+    action = request.form.get('action')
+    doctor_id = request.form.get('doctor_id', type=int)
     
-    return render_template('admin_appointments.html', appointments=appointments)
+    if action == 'cancel-range':
+        try:
+            start_date = datetime.strptime(request.form.get('start_date', ''), '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.form.get('end_date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            start_date = end_date = None
+        if not doctor_id or not start_date or end_date < start_date:
+            counts, message = None, 'Choose a doctor and a valid date range.'
+        else:
+            counts = bulk.cancel_doctor_appointments(doctor_id, start_date, end_date)
+            message = f"{counts['cancelled']} appointment(s) cancelled."
+    elif action == 'complete':
+        ids = request.form.getlist('appointment_ids', type=int)
+        counts = bulk.complete_appointments(ids)
+        message = f"{counts['completed']} appointment(s) marked completed."
+    elif action == 'deactivate-doctor' and doctor_id:
+        counts = bulk.deactivate_doctor(doctor_id)
+        message = (f"Doctor deactivated: {counts['schedules']} schedule(s) deactivated, "
+                   f"{counts['cancelled']} upcoming appointment(s) cancelled.")
+    else:
+        counts, message = None, 'Unknown bulk action.'
+    
+    if request.accept_mimetypes.best == 'application/json':
+        if counts is None:
+            return jsonify({'error': message}), 400
+        return jsonify(counts)
+    flash(message, 'success' if counts is not None else 'error')
+    return redirect(url_for('main.admin_appointments'))
 
 @main.route('/admin/specialties', methods=['GET', 'POST'])
 @login_required
@@ -482,7 +718,7 @@ def admin_specialties():
         db.session.add(specialty)
         db.session.commit()
         flash('Specialty added successfully!', 'success')
+        invalidate('specialties')
         return redirect(url_for('main.admin_specialties'))
     
-    specialties = Specialty.query.all()
-    return render_template('admin_specialties.html', specialties=specialties)
\ No newline at end of file
+    return render_template('admin_specialties.html', specialties=Specialty.query)
\ No newline at end of file
@@ -0,0 +1,343 @@
+"""
+Server-side search over patients, doctors and appointments
+
+On SQLite the searchable text lives in an FTS5 table (``search_index``) that is
+kept in sync with the ORM on every flush. The rowid of each index row encodes
+the entity kind and id so updates and deletes are single rowid lookups.
+Other databases fall back to case-insensitive LIKE queries.
+
+``kind`` is an indexed column so type filters are part of the MATCH rather
+than a post-filter over every hit. Results come newest first (descending
+rowid) instead of by relevance: bm25 ranking has to score every match, which
+for a short prefix is most of the table, while rowid order lets FTS5 stop
+after one page.
+"""
+import re
+import sys
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from app.database import db
+from app.models import Patient, Doctor, Appointment
+from app.tenancy import current_engine, tenant_context, tenant_option
+from app.phone import COUNTRY_CODE, normalize_phone
+
+KINDS = {'patient': 1, 'doctor': 2, 'appointment': 3}
+_KIND_BITS = 2
+
+_TEXT_COLUMNS = '{name phone email reference doctor}'
+
+# Bumped whenever the indexed columns or their contents change; an index
+# built in another layout is rebuilt on startup
+_LAYOUT = '/* layout 3 */'
+
+_CREATE_INDEX_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS search_index {_LAYOUT} USING fts5("
+    "kind, entity_id UNINDEXED, name, phone, email, reference, doctor, "
+    "tokenize = 'unicode61', prefix = '2 3')"
+)
+
+_UPSERT_SQL = text(
+    "INSERT OR REPLACE INTO search_index "
+    "(rowid, kind, entity_id, name, phone, email, reference, doctor) "
+    "VALUES (:rowid, :kind, :entity_id, :name, :phone, :email, :reference, :doctor)"
+)
+
+_DELETE_SQL = text("DELETE FROM search_index WHERE rowid = :rowid")
+
+# A patient's phone is indexed as typed, normalized (+251911234567) and in
+# its local (0911234567) and national (911234567) forms, so any of them
+# matches as a prefix. ``phone_search_text`` builds the same text in Python.
+_PATIENT_PHONE_SQL = (
+    "p.phone || ' ' || COALESCE(p.phone_normalized, '') || "
+    "CASE WHEN p.phone_normalized LIKE '+{cc}%' "
+    "THEN ' 0' || substr(p.phone_normalized, {n}) || ' ' || substr(p.phone_normalized, {n}) "
+    "ELSE '' END"
+).format(cc=COUNTRY_CODE, n=len(COUNTRY_CODE) + 2)
+
+# Set-based rebuild statements, one per entity kind. ``{where}`` lets the same
+# statement reindex a subset, e.g. the appointments of a renamed patient.
+_REBUILD_SQL = {
+    'patient': (
+        "INSERT OR REPLACE INTO search_index "
+        "(rowid, kind, entity_id, name, phone, email, reference, doctor) "
+        "SELECT (p.id << 2) | 1, 'patient', p.id, p.full_name, "
+        f"{_PATIENT_PHONE_SQL}, p.email, NULL, NULL "
+        "FROM patients p {where}"
+    ),
+    'doctor': (
+        "INSERT OR REPLACE INTO search_index "
+        "(rowid, kind, entity_id, name, phone, email, reference, doctor) "
+        "SELECT (d.id << 2) | 2, 'doctor', d.id, d.name, d.phone, d.email, NULL, d.name "
+        "FROM doctors d {where}"
+    ),
+    'appointment': (
+        "INSERT OR REPLACE INTO search_index "
+        "(rowid, kind, entity_id, name, phone, email, reference, doctor) "
+        "SELECT (a.id << 2) | 3, 'appointment', a.id, p.full_name, "
+        f"{_PATIENT_PHONE_SQL}, p.email, "
+        "a.reference_number, d.name "
+        "FROM appointments a "
+        "JOIN patients p ON p.id = a.patient_id "
+        "JOIN doctors d ON d.id = a.doctor_id {where}"
+    ),
+}
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+# A phone number as people type it: digits with optional +, spaces, dashes, dots, brackets
+_PHONE_RE = re.compile(r'(?<!\w)\+?\d[\d\s().-]{5,}\d(?!\w)')
+
+
+def _rowid(kind, entity_id):
+    """Pack kind and entity id into a single FTS rowid"""
+    return (entity_id << _KIND_BITS) | KINDS[kind]
+
+
+def fts_enabled(bind):
+    """Whether the FTS5 index is used for this engine/connection"""
+    return bind.dialect.name == 'sqlite'
+
+
+def _index_sql(connection):
+    """DDL of the existing index table, or None"""
+    return connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+    )).scalar()
+
+
+def _missing_columns(connection):
+    """Base-table columns the rebuild statements need but the database lacks"""
+    present = {c['name'] for c in inspect(connection).get_columns('patients')}
+    return [name for name in ('phone_normalized',) if name not in present]
+
+
+def _after_create(target, connection, **kw):
+    """Create the FTS table alongside the ORM tables and backfill it once
+
+    An index built in an older layout is dropped and rebuilt.
+    A database from before the phone columns gets no index at all rather
+    than an empty one; ``phone-backfill`` adds the columns and builds it.
+    """
+    if not fts_enabled(connection):
+        return
+    existing = _index_sql(connection)
+    if existing is not None and _LAYOUT in existing:
+        return
+    missing = _missing_columns(connection)
+    if missing:
+        print(f"WARNING: search index not built, patients lacks {', '.join(missing)}; "
+              "run `flask --app run phone-backfill`", file=sys.stderr)
+        return
+    connection.execute(text("DROP TABLE IF EXISTS search_index"))
+    connection.execute(text(_CREATE_INDEX_SQL))
+    rebuild_index(connection)
+
+
+def _before_drop(target, connection, **kw):
+    if fts_enabled(connection):
+        connection.execute(text("DROP TABLE IF EXISTS search_index"))
+
+
+def rebuild_index(connection):
+    """Repopulate the whole index from the base tables"""
+    connection.execute(text("DELETE FROM search_index"))
+    for kind in KINDS:
+        connection.execute(text(_REBUILD_SQL[kind].format(where='')))
+
+
+def reindex(connection):
+    """Recreate the index and rebuild it; False when FTS is not used"""
+    if not fts_enabled(connection):
+        return False
+    connection.execute(text("DROP TABLE IF EXISTS search_index"))
+    connection.execute(text(_CREATE_INDEX_SQL))
+    rebuild_index(connection)
+    return True
+
+
+def phone_search_text(phone, normalized):
+    """Indexed phone text for a patient; mirrors ``_PATIENT_PHONE_SQL``"""
+    text_ = f'{phone} {normalized or ""}'
+    if normalized and normalized.startswith('+' + COUNTRY_CODE):
+        national = normalized[len(COUNTRY_CODE) + 1:]
+        text_ += f' 0{national} {national}'
+    return text_
+
+
+def _row_for(obj):
+    """Build the index row for a Patient, Doctor or Appointment instance"""
+    if isinstance(obj, Patient):
+        return {'rowid': _rowid('patient', obj.id), 'kind': 'patient', 'entity_id': obj.id,
+                'name': obj.full_name, 'phone': phone_search_text(obj.phone, obj.phone_normalized),
+                'email': obj.email,
+                'reference': None, 'doctor': None}
+    if isinstance(obj, Doctor):
+        return {'rowid': _rowid('doctor', obj.id), 'kind': 'doctor', 'entity_id': obj.id,
+                'name': obj.name, 'phone': obj.phone, 'email': obj.email,
+                'reference': None, 'doctor': obj.name}
+    return None
+
+
+def _contact_changed(obj):
+    """Whether any column copied into appointment index rows was modified"""
+    names = ('full_name', 'phone', 'email') if isinstance(obj, Patient) else ('name',)
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+def _sync_after_flush(session, flush_context):
+    """Mirror pending Patient/Doctor/Appointment writes into the FTS index"""
+    tracked = (Patient, Doctor, Appointment)
+    changed = [o for o in list(session.new) + list(session.dirty) if isinstance(o, tracked)]
+    deleted = [o for o in session.deleted if isinstance(o, tracked)]
+    if not changed and not deleted:
+        return
+
+    connection = session.connection()
+    if not fts_enabled(connection):
+        return
+
+    appointment_ids = set()
+    for obj in changed:
+        row = _row_for(obj)
+        if row is not None:
+            connection.execute(_UPSERT_SQL, row)
+            # Appointment rows embed patient/doctor details, refresh them too
+            if obj not in session.new and _contact_changed(obj):
+                column = 'a.patient_id' if isinstance(obj, Patient) else 'a.doctor_id'
+                connection.execute(
+                    text(_REBUILD_SQL['appointment'].format(where=f'WHERE {column} = :id')),
+                    {'id': obj.id})
+        else:
+            appointment_ids.add(obj.id)
+
+    if appointment_ids:
+        connection.execute(
+            text(_REBUILD_SQL['appointment'].format(
+                where='WHERE a.id IN ({})'.format(','.join(str(int(i)) for i in appointment_ids)))))
+
+    for obj in deleted:
+        kind = {Patient: 'patient', Doctor: 'doctor', Appointment: 'appointment'}[type(obj)]
+        connection.execute(_DELETE_SQL, {'rowid': _rowid(kind, obj.id)})
+
+
+def _normalize_phone_term(match):
+    """``+251...`` for text that normalizes to a phone number, else the text unchanged"""
+    normalized = normalize_phone(match.group())
+    return normalized if normalized and normalized.startswith('+') else match.group()
+
+
+def _match_expression(query, kinds=None):
+    """Turn free text into an FTS5 prefix query over the text columns
+
+    ``abe bek`` -> ``{name ...} : ("abe"* "bek"*)``, plus ``AND kind : (...)``
+    when only some kinds are wanted. Phone numbers are normalized first, so
+    ``0911 234 567`` searches for the single term ``251911234567``.
+    """
+    query = _PHONE_RE.sub(_normalize_phone_term, query)
+    terms = _TERM_RE.findall(query)
+    if not terms:
+        return ''
+    expression = '{} : ({})'.format(_TEXT_COLUMNS, ' '.join(f'"{term}"*' for term in terms))
+    if kinds and set(kinds) != set(KINDS):
+        expression += ' AND kind : ({})'.format(' OR '.join(kinds))
+    return expression
+
+
+def _search_fts(query, kinds, limit, offset):
+    expression = _match_expression(query, kinds)
+    if not expression:
+        return []
+    rows = db.session.execute(text(
+        "SELECT kind, entity_id FROM search_index WHERE search_index MATCH :match "
+        "ORDER BY rowid DESC LIMIT :limit OFFSET :offset"
+    ), {'match': expression, 'limit': limit, 'offset': offset}).all()
+    return [(row.kind, int(row.entity_id)) for row in rows]
+
+
+def _search_like(query, kinds, limit, offset):
+    """Portable fallback used when FTS5 is not available"""
+    pattern = f'%{query}%'
+    hits = []
+    if 'patient' in kinds:
+        hits += [('patient', i) for (i,) in db.session.query(Patient.id).filter(db.or_(
+            Patient.full_name.ilike(pattern), Patient.phone.ilike(pattern),
+            Patient.email.ilike(pattern))).order_by(Patient.id).limit(offset + limit)]
+    if 'doctor' in kinds:
+        hits += [('doctor', i) for (i,) in db.session.query(Doctor.id).filter(db.or_(
+            Doctor.name.ilike(pattern), Doctor.phone.ilike(pattern),
+            Doctor.email.ilike(pattern))).order_by(Doctor.id).limit(offset + limit)]
+    if 'appointment' in kinds:
+        hits += [('appointment', i) for (i,) in db.session.query(Appointment.id)
+                 .join(Patient).join(Doctor).filter(db.or_(
+                     Appointment.reference_number.ilike(pattern),
+                     Patient.full_name.ilike(pattern), Patient.phone.ilike(pattern),
+                     Patient.email.ilike(pattern), Doctor.name.ilike(pattern)))
+                 .order_by(Appointment.id.desc()).limit(offset + limit)]
+    return hits[offset:offset + limit]
+
+
+def _serialize(kind, obj):
+    if kind == 'patient':
+        return {'type': kind, 'id': obj.id, 'name': obj.full_name,
+                'phone': obj.phone, 'email': obj.email}
+    if kind == 'doctor':
+        return {'type': kind, 'id': obj.id, 'name': obj.name, 'phone': obj.phone,
+                'email': obj.email, 'is_active': obj.is_active}
+    return {'type': kind, 'id': obj.id, 'reference_number': obj.reference_number,
+            'patient_name': obj.patient.full_name, 'phone': obj.patient.phone,
+            'doctor_name': obj.doctor.name,
+            'appointment_date': obj.appointment_date.strftime('%Y-%m-%d'),
+            'appointment_time': obj.appointment_time.strftime('%H:%M'),
+            'status': obj.status}
+
+
+def search(query, kinds=None, page=1, per_page=20):
+    """Search entities and return ``(results, has_more)`` for one page
+
+    One extra hit is fetched to decide ``has_more`` so no COUNT(*) over the
+    match set is needed.
+    """
+    kinds = [k for k in (kinds or KINDS) if k in KINDS]
+    if not kinds or not query.strip():
+        return [], False
+
+    offset = (page - 1) * per_page
+    finder = _search_fts if fts_enabled(db.session.get_bind()) else _search_like
+    hits = finder(query, kinds, per_page + 1, offset)
+    has_more = len(hits) > per_page
+    hits = hits[:per_page]
+
+    # Hydrate with one query per kind, preserving result order
+    models = {'patient': Patient, 'doctor': Doctor, 'appointment': Appointment}
+    loaded = {}
+    for kind in kinds:
+        ids = [entity_id for k, entity_id in hits if k == kind]
+        if ids:
+            query_ = models[kind].query.filter(models[kind].id.in_(ids))
+            if kind == 'appointment':
+                query_ = query_.options(db.joinedload(Appointment.patient),
+                                        db.joinedload(Appointment.doctor))
+            loaded.update({(kind, obj.id): obj for obj in query_})
+
+    results = [_serialize(kind, loaded[(kind, entity_id)])
+               for kind, entity_id in hits if (kind, entity_id) in loaded]
+    return results, has_more
+
+
+def init_app(app):
+    """Register index DDL, ORM sync hooks and the reindex CLI command"""
+    if not event.contains(db.metadata, 'after_create', _after_create):
+        event.listen(db.metadata, 'after_create', _after_create)
+        event.listen(db.metadata, 'before_drop', _before_drop)
+    if not event.contains(Session, 'after_flush', _sync_after_flush):
+        event.listen(Session, 'after_flush', _sync_after_flush)
+
+    @app.cli.command('search-reindex')
+    @tenant_option
+    def search_reindex(tenant):
+        """Rebuild the full-text search index from the database"""
+        with tenant_context(app, tenant), current_engine().begin() as connection:
+            if not reindex(connection):
+                print('Full-text index is only used on SQLite; nothing to do.')
+                return
+        print('Search index rebuilt.')
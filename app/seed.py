@@ -0,0 +1,254 @@
+"""
+Synthetic data for performance work
+
+``flask --app run seed-synthetic`` adds doctors, patients (with logins) and
+appointments to the current database with batched multi-row INSERTs, e.g.
+
+    flask --app run seed-synthetic --doctors 500 --patients 1000000 --appointments 10000000
+
+Doctors get the same weekday schedule as ``init_db.py``. Appointments fill
+each doctor's slots with probability ``--density``, walking back from
+``--future-days`` ahead of today until the requested number is reached, so
+the date span grows with the row count. Past appointments take their status
+from ``--status-mix``; upcoming ones are scheduled except for the cancelled
+share. Every synthetic patient logs in as ``synthetic<N>`` / ``patient123``.
+Runs are deterministic for a given ``--seed``.
+"""
+import random
+import time as timer
+from datetime import date, datetime, time, timedelta
+import click
+from sqlalchemy import func, insert, select, text
+from werkzeug.security import generate_password_hash
+from app.database import db
+from app.models import User, Patient, Specialty, Doctor, Schedule, Appointment
+from app.phone import reversed_digits
+from app import search
+
+FIRST_NAMES = ['Abebe', 'Tigist', 'Yohannes', 'Meseret', 'Hana', 'Dawit', 'Selam', 'Bereket',
+               'Mahlet', 'Samuel', 'Liya', 'Kebede', 'Rahel', 'Tesfaye', 'Marta', 'Henok',
+               'Saba', 'Biniam', 'Eden', 'Girma']
+LAST_NAMES = ['Bekele', 'Haile', 'Tesfaye', 'Alemayehu', 'Wolde', 'Girma', 'Tadesse', 'Kebede',
+              'Mengistu', 'Assefa', 'Desta', 'Negash', 'Abera', 'Mulugeta', 'Hailu', 'Getachew']
+SPECIALTIES = ['General Medicine', 'Cardiology', 'Pediatrics', 'Orthopedics', 'Dermatology']
+
+WORKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+BLOCKS = [(time(9, 0), time(12, 0)), (time(14, 0), time(17, 0))]
+SLOT_MINUTES = 30
+SLOT_TIMES = [time(start.hour + (m // 60), m % 60)
+              for start, end in BLOCKS
+              for m in range(0, (end.hour - start.hour) * 60, SLOT_MINUTES)]
+
+DEFAULT_STATUS_MIX = {'completed': 0.75, 'cancelled': 0.15, 'scheduled': 0.10}
+
+
+def parse_status_mix(value):
+    """``completed=0.7,cancelled=0.2,scheduled=0.1`` -> normalized weights"""
+    mix = {}
+    for part in value.split(','):
+        status, _, weight = part.partition('=')
+        if status.strip() not in DEFAULT_STATUS_MIX:
+            raise ValueError(f'Unknown status {status.strip()!r}')
+        mix[status.strip()] = float(weight)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError('Status weights must add up to more than zero')
+    return {status: weight / total for status, weight in mix.items()}
+
+
+def _next_id(connection, model):
+    return (connection.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _reset_sequences(*models):
+    """Move PostgreSQL id sequences past the ids inserted explicitly
+
+    Rows are seeded with ids from ``_next_id``, which leaves the tables'
+    sequences behind, so the next ORM insert would collide with a seeded id.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as connection:
+        for model in models:
+            table = model.__table__.name
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"))
+
+
+def _insert_batches(table, rows, batch_size, label, progress):
+    """Insert ``rows`` (an iterable of dicts) with one executemany per batch and transaction"""
+    total = 0
+    batch = []
+    started = timer.monotonic()
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            with db.engine.begin() as connection:
+                connection.execute(insert(table), batch)
+            total += len(batch)
+            batch = []
+            progress(f'  {label}: {total} ({total / (timer.monotonic() - started):.0f}/s)')
+    if batch:
+        with db.engine.begin() as connection:
+            connection.execute(insert(table), batch)
+        total += len(batch)
+    return total
+
+
+def _specialty_ids():
+    with db.engine.begin() as connection:
+        ids = connection.execute(select(Specialty.id).order_by(Specialty.id)).scalars().all()
+        if not ids:
+            connection.execute(insert(Specialty.__table__), [
+                {'name': name, 'created_at': datetime.utcnow()} for name in SPECIALTIES])
+            ids = connection.execute(select(Specialty.id).order_by(Specialty.id)).scalars().all()
+    return ids
+
+
+def seed_synthetic(doctors=50, patients=10000, appointments=100000, density=0.6,
+                   future_days=28, status_mix=None, batch_size=10000, seed=0,
+                   index_search=True, progress=print):
+    """Add synthetic rows in bulk; returns the number of rows inserted per table"""
+    rng = random.Random(seed)
+    status_mix = status_mix or DEFAULT_STATUS_MIX
+    statuses, weights = list(status_mix), list(status_mix.values())
+    cancelled_share = status_mix.get('cancelled', 0)
+    now = datetime.utcnow()
+    today = date.today()
+    counts = {}
+
+    with db.engine.connect() as connection:
+        first_user = _next_id(connection, User)
+        first_patient = _next_id(connection, Patient)
+        first_doctor = _next_id(connection, Doctor)
+        first_appointment = _next_id(connection, Appointment)
+        # Without new patients, appointments go to the ones already there
+        existing_patients = [] if patients else connection.execute(
+            select(Patient.id)).scalars().all()
+
+    # One hash for every synthetic login: hashing a million passwords would dominate the run
+    password_hash = generate_password_hash('patient123')
+
+    def user_rows():
+        for n in range(patients):
+            yield {'id': first_user + n, 'username': f'synthetic{first_patient + n}',
+                   'password_hash': password_hash, 'role': 'patient', 'created_at': now}
+
+    def patient_rows():
+        for n in range(patients):
+            number = first_patient + n
+            phone = f'+2519{number % 10 ** 8:08d}'
+            yield {'id': number, 'user_id': first_user + n,
+                   'full_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                   'phone': phone, 'phone_normalized': phone,
+                   'phone_reversed': reversed_digits(phone),
+                   'email': f'synthetic{number}@example.com',
+                   'date_of_birth': date(1940, 1, 1) + timedelta(days=rng.randrange(30000)),
+                   'gender': rng.choice(('Male', 'Female')),
+                   'address': 'Addis Ababa, Ethiopia', 'created_at': now, 'updated_at': now}
+
+    progress(f'Seeding {patients} patients...')
+    counts['users'] = _insert_batches(User.__table__, user_rows(), batch_size, 'users', progress)
+    counts['patients'] = _insert_batches(Patient.__table__, patient_rows(), batch_size,
+                                         'patients', progress)
+
+    specialty_ids = _specialty_ids()
+
+    def doctor_rows():
+        for n in range(doctors):
+            number = first_doctor + n
+            yield {'id': number, 'name': f'Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                   'specialty_id': specialty_ids[n % len(specialty_ids)],
+                   'qualification': 'MD', 'experience_years': rng.randint(1, 35),
+                   'phone': f'+2511{number % 10 ** 8:08d}',
+                   'email': f'doctor{number}@hospital.com', 'is_active': True, 'created_at': now}
+
+    def schedule_rows():
+        for n in range(doctors):
+            for day in WORKDAYS:
+                for start, end in BLOCKS:
+                    yield {'doctor_id': first_doctor + n, 'day_of_week': day, 'start_time': start,
+                           'end_time': end, 'slot_duration': SLOT_MINUTES, 'is_active': True,
+                           'created_at': now}
+
+    progress(f'Seeding {doctors} doctors...')
+    counts['doctors'] = _insert_batches(Doctor.__table__, doctor_rows(), batch_size,
+                                        'doctors', progress)
+    counts['schedules'] = _insert_batches(Schedule.__table__, schedule_rows(), batch_size,
+                                          'schedules', progress)
+
+    patient_ids = range(first_patient, first_patient + patients) if patients else existing_patients
+    doctor_ids = range(first_doctor, first_doctor + doctors)
+
+    def appointment_rows():
+        if not patient_ids or not doctor_ids or density <= 0:
+            return
+        made = 0
+        day = today + timedelta(days=future_days)
+        while made < appointments:
+            if day.weekday() < 5:
+                upcoming = day >= today
+                for doctor_id in doctor_ids:
+                    for slot in SLOT_TIMES:
+                        if rng.random() >= density:
+                            continue
+                        if upcoming:
+                            status = 'cancelled' if rng.random() < cancelled_share else 'scheduled'
+                        else:
+                            status = rng.choices(statuses, weights)[0]
+                        number = first_appointment + made
+                        created = datetime.combine(day, slot) - timedelta(days=rng.randint(1, 30))
+                        yield {'id': number, 'reference_number': f'SYN{number:012d}',
+                               'patient_id': rng.choice(patient_ids), 'doctor_id': doctor_id,
+                               'appointment_date': day, 'appointment_time': slot,
+                               'status': status, 'created_at': created, 'updated_at': created}
+                        made += 1
+                        if made >= appointments:
+                            return
+            day -= timedelta(days=1)
+
+    progress(f'Seeding {appointments} appointments...')
+    counts['appointments'] = _insert_batches(Appointment.__table__, appointment_rows(),
+                                             batch_size, 'appointments', progress)
+    _reset_sequences(User, Patient, Doctor, Appointment)
+
+    if index_search:
+        progress('Rebuilding search index...')
+        with db.engine.begin() as connection:
+            search.reindex(connection)
+    return counts
+
+
+def init_app(app):
+    """Register the synthetic data command"""
+
+    @app.cli.command('seed-synthetic')
+    @click.option('--doctors', default=50, show_default=True)
+    @click.option('--patients', default=10000, show_default=True)
+    @click.option('--appointments', default=100000, show_default=True)
+    @click.option('--density', default=0.6, show_default=True,
+                  help='Share of each doctor\'s slots that are booked.')
+    @click.option('--future-days', default=28, show_default=True,
+                  help='How far ahead of today bookings extend.')
+    @click.option('--status-mix', default='completed=0.75,cancelled=0.15,scheduled=0.10',
+                  show_default=True, help='Status weights for past appointments.')
+    @click.option('--batch-size', default=10000, show_default=True,
+                  help='Rows per INSERT batch and transaction.')
+    @click.option('--seed', default=0, show_default=True, help='Random seed.')
+    @click.option('--no-search-index', is_flag=True,
+                  help='Skip rebuilding the full-text index afterwards.')
+    def seed_synthetic_command(doctors, patients, appointments, density, future_days,
+                               status_mix, batch_size, seed, no_search_index):
+        """Add large volumes of synthetic doctors, patients and appointments"""
+        from app.cache import invalidate
+        try:
+            mix = parse_status_mix(status_mix)
+        except ValueError as exc:
+            raise click.BadParameter(str(exc), param_hint='--status-mix')
+        started = timer.monotonic()
+        counts = seed_synthetic(doctors, patients, appointments, density, future_days, mix,
+                                batch_size, seed, index_search=not no_search_index)
+        invalidate('specialties', 'doctors', 'schedules')
+        summary = ', '.join(f'{count} {table}' for table, count in counts.items())
+        print(f'Inserted {summary} in {timer.monotonic() - started:.1f}s.')
@@ -0,0 +1,50 @@
+"""
+Template fragment caching and the Jinja bytecode cache
+
+``{% cache key, ttl, 'namespace', ... %}...{% endcache %}`` renders its body
+once and stores the HTML in the shared cache (``app.cache``). The key is
+scoped to the current tenant; the optional namespaces tie the fragment to
+the same version counters the routes ``invalidate()`` after admin writes, so
+an edited specialty re-renders every fragment that lists specialties. A
+``ttl`` of ``None`` uses ``CACHE_DEFAULT_TTL``.
+
+Views pass queries (or callables) rather than results to cached fragments,
+so a cache hit skips the database as well as the rendering.
+
+Compiled templates are kept in a ``FileSystemBytecodeCache``, so a fresh
+worker loads bytecode from disk instead of compiling every template.
+"""
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from app.cache import memoize
+
+
+class FragmentCacheExtension(Extension):
+    """Adds the ``{% cache %}`` tag"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        key, ttl, namespaces = args[0], args[1] if len(args) > 1 else nodes.Const(None), args[2:]
+
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render_fragment', [key, ttl, nodes.Tuple(namespaces, 'load')])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, key, ttl, namespaces, caller):
+        html = memoize(f'fragment:{key}', lambda: str(caller()), ttl, depends_on=namespaces)
+        return Markup(html)
+
+
+def init_app(app):
+    """Enable the fragment cache tag and the on-disk bytecode cache"""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    if app.config.get('JINJA_BYTECODE_CACHE_ENABLED'):
+        # Default directory is a per-user folder in the temp dir
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+            app.config.get('JINJA_BYTECODE_CACHE_DIR'))
@@ -0,0 +1,221 @@
+"""
+Multi-hospital tenancy
+
+Tenants are listed in a JSON file named by ``TENANTS_FILE`` (or given
+directly as ``TENANTS`` in the config)::
+
+    {
+      "stmary": {
+        "hosts": ["stmary.example.org"],
+        "path_prefix": "/stmary",
+        "database_url": "postgresql+psycopg://.../stmary",
+        "pool_size": 5,
+        "max_overflow": 5,
+        "config": {"HOSPITAL_NAME": "St. Mary's Hospital", "HOSPITAL_SERVICES": ["..."]}
+      }
+    }
+
+A WSGI middleware resolves the tenant from the Host header or a path prefix
+(moved into ``SCRIPT_NAME`` so ``url_for`` keeps generating prefixed URLs).
+Each tenant gets its own engine with a bounded connection pool, created on
+first use, so a busy hospital exhausts only its own pool. The engine is put
+on ``g`` and ``RoutingSession`` sends every query there, so the views run
+unchanged. Requests that match no tenant use the default database.
+
+CLI commands take ``--tenant KEY`` and run inside ``tenant_context``, which
+binds the same engine and settings on the app context.
+"""
+import json
+import threading
+from contextlib import contextmanager
+import click
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import create_engine, make_url
+from app.database import db
+
+DEFAULT_TENANT = 'default'
+
+ENVIRON_KEY = 'easybook.tenant'
+
+
+class Tenant:
+    """One hospital: its routing rules, settings and lazily created engine"""
+
+    def __init__(self, key, options):
+        self.key = key
+        self.hosts = {h.lower() for h in options.get('hosts', [])}
+        self.path_prefix = options.get('path_prefix', '').rstrip('/')
+        self.database_url = options['database_url']
+        self.pool_size = options.get('pool_size', 5)
+        self.max_overflow = options.get('max_overflow', 5)
+        self.pool_timeout = options.get('pool_timeout', 10)
+        self.config = options.get('config', {})
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = self._create_engine()
+        return self._engine
+
+    def _create_engine(self):
+        options = {}
+        url = make_url(self.database_url)
+        if not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')):
+            options.update(pool_size=self.pool_size, max_overflow=self.max_overflow,
+                           pool_timeout=self.pool_timeout, pool_pre_ping=True)
+        engine = create_engine(url, **options)
+        db.metadata.create_all(engine)
+        return engine
+
+    def __repr__(self):
+        return f'<Tenant {self.key}>'
+
+
+class TenantRegistry:
+    """Tenants by key, with host and path-prefix lookup tables"""
+
+    def __init__(self, tenants):
+        self.tenants = {key: Tenant(key, options) for key, options in tenants.items()}
+        self.by_host = {host: t for t in self.tenants.values() for host in t.hosts}
+        # Longest prefix first so /a/b wins over /a
+        self.prefixed = sorted((t for t in self.tenants.values() if t.path_prefix),
+                               key=lambda t: len(t.path_prefix), reverse=True)
+
+    def resolve(self, environ):
+        """Find the tenant for a WSGI request, moving a matched path prefix into SCRIPT_NAME"""
+        path = environ.get('PATH_INFO', '')
+        for tenant in self.prefixed:
+            prefix = tenant.path_prefix
+            if path == prefix or path.startswith(prefix + '/'):
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + prefix
+                environ['PATH_INFO'] = path[len(prefix):] or '/'
+                return tenant
+        host = environ.get('HTTP_HOST', '').split(':')[0].lower()
+        return self.by_host.get(host)
+
+
+class TenantMiddleware:
+    """WSGI middleware that tags each request with its tenant"""
+
+    def __init__(self, wsgi_app, registry):
+        self.wsgi_app = wsgi_app
+        self.registry = registry
+
+    def __call__(self, environ, start_response):
+        environ[ENVIRON_KEY] = self.registry.resolve(environ)
+        return self.wsgi_app(environ, start_response)
+
+
+def current_tenant():
+    """The Tenant serving the current request or command, or None for the default database"""
+    if not has_app_context():
+        return None
+    return g.get('tenant')
+
+
+def current_engine():
+    """Primary engine of the current tenant, or the default engine"""
+    tenant = current_tenant()
+    return tenant.engine if tenant is not None else db.engine
+
+
+def tenant_key():
+    tenant = current_tenant()
+    return tenant.key if tenant else DEFAULT_TENANT
+
+
+def tenant_setting(name):
+    """Config value for the current tenant, falling back to the app config"""
+    tenant = current_tenant()
+    if tenant is not None and name in tenant.config:
+        return tenant.config[name]
+    return current_app.config[name]
+
+
+def cache_key(*parts):
+    """Build a cache key scoped to the current tenant"""
+    return ':'.join(str(p) for p in (tenant_key(),) + parts)
+
+
+def qualify_user_id(user_id):
+    """Login session id for a user, tied to the tenant it belongs to"""
+    key = tenant_key()
+    return str(user_id) if key == DEFAULT_TENANT else f'{key}:{user_id}'
+
+
+def resolve_user_id(session_id):
+    """Database id from a login session id, or None if it belongs to another tenant"""
+    key, _, user_id = session_id.rpartition(':')
+    if (key or DEFAULT_TENANT) != tenant_key():
+        return None
+    try:
+        return int(user_id)
+    except ValueError:
+        return None
+
+
+def find_tenant(app, key):
+    """The Tenant named ``key``, or None for the default database"""
+    if key in (None, DEFAULT_TENANT):
+        return None
+    registry = app.extensions.get('tenants')
+    if registry is None or key not in registry.tenants:
+        raise click.BadParameter(f'unknown tenant {key!r}', param_hint="'--tenant'")
+    return registry.tenants[key]
+
+
+@contextmanager
+def tenant_context(app, key):
+    """App context bound to one tenant's database and settings, for CLI commands"""
+    tenant = find_tenant(app, key)
+    with app.app_context():
+        g.tenant = tenant
+        if tenant is not None:
+            g.db_engine = tenant.engine
+        yield tenant
+
+
+def tenant_settings(app, tenant):
+    """The app config with ``tenant``'s overrides applied"""
+    settings = dict(app.config)
+    if tenant is not None:
+        settings.update(tenant.config)
+    return settings
+
+
+tenant_option = click.option(
+    '--tenant', default=DEFAULT_TENANT, show_default=True,
+    help='Tenant (from TENANTS_FILE) whose database and settings to use.')
+
+
+def load_tenants(app):
+    tenants = app.config.get('TENANTS') or {}
+    path = app.config.get('TENANTS_FILE')
+    if path and not tenants:
+        with open(path, encoding='utf-8') as f:
+            tenants = json.load(f)
+    return tenants
+
+
+def init_app(app):
+    """Install tenant resolution when tenants are configured"""
+    tenants = load_tenants(app)
+    if not tenants:
+        return None
+
+    registry = TenantRegistry(tenants)
+    app.extensions['tenants'] = registry
+    app.wsgi_app = TenantMiddleware(app.wsgi_app, registry)
+
+    @app.before_request
+    def bind_tenant():
+        tenant = request.environ.get(ENVIRON_KEY)
+        g.tenant = tenant
+        if tenant is not None:
+            g.db_engine = tenant.engine
+
+    return registry
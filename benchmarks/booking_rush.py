@@ -0,0 +1,376 @@
+"""
+Booking-rush load scenario: many patients competing for one doctor's week
+
+Seeds a fresh SQLite database, starts the app under gunicorn with several
+workers, and runs concurrent logged-in patients through the real flow:
+
+    login -> doctors for the specialty -> free slots -> book -> sometimes cancel
+
+All patients go after the same popular doctor's slots next week, which is
+the moment the booking path is most contended. At the end it reports
+throughput, latency percentiles per step, HTTP errors, bookings rejected
+because the slot was taken, double bookings left in the database (two
+scheduled appointments in one slot), and SQLite lock contention: "database
+is locked" errors in the server log, and how long a writer has to wait for
+the lock. A probe thread runs ``BEGIN IMMEDIATE`` against the database every
+``--probe-interval`` seconds and times how long acquiring the write lock
+takes. The lock is released at once, so the probe adds almost no contention.
+
+    python benchmarks/booking_rush.py --patients 200 --workers 4 --duration 30
+    python benchmarks/booking_rush.py --patients 200 --wal --json rush.json
+
+Rate limits are switched off unless ``--rate-limits`` is given, since every
+simulated patient comes from the same address.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STEPS = ['login', 'doctors', 'slots', 'book', 'dashboard', 'cancel']
+CANCEL_LINK = re.compile(r'/cancel-appointment/(\d+)')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed_database(workdir, args):
+    """Create the database with synthetic patients; returns (doctor_id, specialty_id)"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'rush.db')}"
+    os.environ['CACHE_PATH'] = os.path.join(workdir, 'cache.db')
+    from app import create_app
+    from app.database import db
+    from app.models import Doctor
+    from app.seed import seed_synthetic
+
+    app = create_app()
+    with app.app_context():
+        # future_days=0: nothing is booked ahead yet, the week is about to open
+        seed_synthetic(doctors=args.doctors, patients=args.patients,
+                       appointments=args.background_appointments, future_days=0,
+                       seed=args.seed, progress=lambda message: None)
+        doctor = Doctor.query.order_by(Doctor.id).first()
+        doctor_id, specialty_id = doctor.id, doctor.specialty_id
+        db.session.remove()
+        db.engine.dispose()
+
+    if args.wal:
+        connection = sqlite3.connect(os.path.join(workdir, 'rush.db'))
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.close()
+    return doctor_id, specialty_id
+
+
+def start_server(workdir, port, args):
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'rush.db')}",
+               CACHE_PATH=os.path.join(workdir, 'cache.db'),
+               RATELIMIT_STORAGE_PATH=os.path.join(workdir, 'ratelimit.db'),
+               RATELIMIT_ENABLED='1' if args.rate_limits else '0',
+               SECRET_KEY='booking-rush')
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    command = [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers),
+               '--threads', str(args.threads), '--bind', f'127.0.0.1:{port}',
+               '--timeout', '120', 'run:app']
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited; see {log.name}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return server, log
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start listening within 30s')
+
+
+class Patient:
+    """One simulated browser: keep-alive connection plus session cookies"""
+
+    def __init__(self, port, username, stats):
+        self.port = port
+        self.username = username
+        self.stats = stats
+        self.cookies = {}
+        self.connection = None
+
+    def request(self, step, method, path, form=None):
+        body = urlencode(form, doseq=True) if form is not None else None
+        headers = {'Cookie': '; '.join(f'{k}={v}' for k, v in self.cookies.items())}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        start = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            if self.connection is not None:
+                self.connection.close()
+            self.connection = None
+            self.stats.record(step, time.perf_counter() - start, 'error')
+            return None, None, b''
+
+        self.stats.record(step, time.perf_counter() - start, response.status)
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie':
+                name, _, rest = value.partition('=')
+                self.cookies[name] = rest.split(';', 1)[0]
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+            self.connection = None
+        return response.status, response.getheader('Location') or '', data
+
+    def run(self, doctor_id, specialty_id, week, args, stop, rng):
+        status, _, _ = self.request('login', 'POST', '/login',
+                                    {'username': self.username, 'password': 'patient123'})
+        if status != 302:
+            self.stats.count('login_failed')
+            return
+
+        while not stop.is_set():
+            self.request('doctors', 'GET', f'/api/doctors/{specialty_id}')
+            days = rng.sample(week, len(week))
+            slots = []
+            for day in days:
+                status, _, data = self.request('slots', 'GET',
+                                               f'/api/available-slots/{doctor_id}/{day}')
+                slots = json.loads(data) if status == 200 else []
+                if slots:
+                    break
+            if not slots:
+                self.stats.count('sold_out')
+                stop.wait(args.think_time)
+                continue
+
+            status, location, _ = self.request('book', 'POST', '/book-appointment', {
+                'doctor_id': doctor_id, 'appointment_date': day,
+                'appointment_time': rng.choice(slots), 'notes': 'booking rush'})
+            if status == 302 and location.endswith('/patient/dashboard'):
+                self.stats.count('booked')
+                if rng.random() < args.cancel_rate:
+                    _, _, page = self.request('dashboard', 'GET', '/patient/dashboard')
+                    ids = CANCEL_LINK.findall(page.decode('utf-8', 'replace'))
+                    if ids:
+                        status, _, _ = self.request('cancel', 'POST',
+                                                    f'/cancel-appointment/{rng.choice(ids)}')
+                        if status == 302:
+                            self.stats.count('cancelled')
+            elif status == 302:
+                self.stats.count('slot_taken')
+            stop.wait(args.think_time * rng.random())
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {step: [] for step in STEPS}
+        self.statuses = {}
+        self.counters = {}
+
+    def record(self, step, seconds, status):
+        with self.lock:
+            self.latencies[step].append(seconds * 1000)
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+
+class LockProbe(threading.Thread):
+    """Periodically time how long taking SQLite's write lock takes"""
+
+    def __init__(self, database, interval, stop):
+        super().__init__(daemon=True)
+        self.database = database
+        self.interval = interval
+        self.stop = stop
+        self.waits = []  # ms per probe
+        self.timeouts = 0
+
+    def run(self):
+        # Generous busy timeout: the probe should wait for the lock, not fail
+        connection = sqlite3.connect(self.database, timeout=60, isolation_level=None)
+        try:
+            while not self.stop.wait(self.interval):
+                start = time.perf_counter()
+                try:
+                    connection.execute('BEGIN IMMEDIATE')
+                except sqlite3.OperationalError:
+                    self.timeouts += 1
+                    continue
+                self.waits.append((time.perf_counter() - start) * 1000)
+                connection.execute('ROLLBACK')
+        finally:
+            connection.close()
+
+    def report(self):
+        if not self.waits:
+            return {'probes': 0, 'timeouts': self.timeouts}
+        return {
+            'probes': len(self.waits),
+            'timeouts': self.timeouts,
+            'p50': round(percentile(self.waits, 50), 2),
+            'p95': round(percentile(self.waits, 95), 2),
+            'max': round(max(self.waits), 2),
+            'total': round(sum(self.waits), 1),
+        }
+
+
+def double_bookings(database):
+    """Slots holding more than one scheduled appointment"""
+    connection = sqlite3.connect(database)
+    try:
+        return connection.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM appointments WHERE status = 'scheduled' "
+            "GROUP BY doctor_id, appointment_date, appointment_time HAVING COUNT(*) > 1)"
+        ).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def next_week():
+    monday = date.today() + timedelta(days=7 - date.today().weekday())
+    return [(monday + timedelta(days=i)).isoformat() for i in range(5)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--patients', type=int, default=200, help='Concurrent simulated patients.')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of load.')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes.')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker.')
+    parser.add_argument('--cancel-rate', type=float, default=0.2,
+                        help='Share of successful bookings that are then cancelled.')
+    parser.add_argument('--think-time', type=float, default=0.5,
+                        help='Upper bound of the random pause between flows, in seconds.')
+    parser.add_argument('--doctors', type=int, default=20)
+    parser.add_argument('--background-appointments', type=int, default=50000,
+                        help='Past appointments seeded before the rush.')
+    parser.add_argument('--wal', action='store_true', help='Put the database in WAL mode.')
+    parser.add_argument('--rate-limits', action='store_true', help='Keep rate limits enabled.')
+    parser.add_argument('--probe-interval', type=float, default=0.05,
+                        help='Seconds between write-lock wait probes.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Also write the report to this file.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='easybook-rush-')
+    print(f'Seeding {args.patients} patients in {workdir}...')
+    doctor_id, specialty_id = seed_database(workdir, args)
+    port = free_port()
+    server, log = start_server(workdir, port, args)
+    week = next_week()
+    print(f'gunicorn: {args.workers} workers x {args.threads} threads on port {port}; '
+          f'{args.patients} patients booking doctor {doctor_id} for {week[0]}..{week[-1]}')
+
+    stats = Stats()
+    stop = threading.Event()
+    probe = LockProbe(os.path.join(workdir, 'rush.db'), args.probe_interval, stop)
+    patients = [Patient(port, f'synthetic{n + 1}', stats) for n in range(args.patients)]
+    threads = [threading.Thread(target=p.run, daemon=True,
+                                args=(doctor_id, specialty_id, week, args, stop,
+                                      random.Random(args.seed + n)))
+               for n, p in enumerate(patients)]
+    started = time.perf_counter()
+    try:
+        probe.start()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=60)
+        probe.join(timeout=60)
+        elapsed = time.perf_counter() - started
+        server.terminate()
+        server.wait(timeout=30)
+        log.close()
+
+    with open(os.path.join(workdir, 'server.log'), errors='replace') as f:
+        server_log = f.read()
+
+    requests = sum(len(samples) for samples in stats.latencies.values())
+    report = {
+        'patients': args.patients,
+        'workers': args.workers,
+        'threads': args.threads,
+        'wal': args.wal,
+        'duration_s': round(elapsed, 2),
+        'requests': requests,
+        'requests_per_s': round(requests / elapsed, 1),
+        'bookings_per_s': round(stats.counters.get('booked', 0) / elapsed, 2),
+        'statuses': stats.statuses,
+        'errors': sum(n for status, n in stats.statuses.items()
+                      if status == 'error' or status.startswith('5')),
+        'outcomes': stats.counters,
+        'double_bookings': double_bookings(os.path.join(workdir, 'rush.db')),
+        'lock_errors': server_log.count('database is locked'),
+        'lock_wait_ms': probe.report(),
+        'latency_ms': {
+            step: {
+                'count': len(samples),
+                'p50': round(percentile(samples, 50), 1),
+                'p95': round(percentile(samples, 95), 1),
+                'p99': round(percentile(samples, 99), 1),
+                'max': round(max(samples), 1),
+                'mean': round(statistics.fmean(samples), 1),
+            } for step, samples in stats.latencies.items() if samples
+        },
+        'server_log': log.name,
+    }
+
+    print(f"\n{report['requests']} requests in {report['duration_s']}s "
+          f"({report['requests_per_s']}/s), {report['bookings_per_s']} bookings/s")
+    print(f"outcomes: {report['outcomes']}")
+    print(f"statuses: {report['statuses']}")
+    print(f"errors: {report['errors']}   double bookings: {report['double_bookings']}   "
+          f"'database is locked': {report['lock_errors']}")
+    wait = report['lock_wait_ms']
+    if wait['probes']:
+        print(f"write lock wait ({wait['probes']} probes): p50 {wait['p50']} ms   "
+              f"p95 {wait['p95']} ms   max {wait['max']} ms   total {wait['total']} ms   "
+              f"timeouts {wait['timeouts']}")
+    print(f"\n{'step':10s} {'count':>7s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}  (ms)")
+    for step, row in report['latency_ms'].items():
+        print(f"{step:10s} {row['count']:7d} {row['p50']:8.1f} {row['p95']:8.1f} "
+              f"{row['p99']:8.1f} {row['max']:8.1f}")
+    print(f'\nServer log: {log.name}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Admission-control harness: normal users' latency under an abusive client
+
+Starts the app on a local threaded server and measures the latency of
+well-behaved clients polling ``/api/available-slots`` in three runs:
+
+1. normal users only (baseline)
+2. normal users + an abusive client hammering the same endpoint, limits off
+3. the same, with the rate limiter and concurrency cap enabled
+
+Clients are told apart by ``X-Forwarded-For`` (the app trusts one proxy
+hop, ``TRUSTED_PROXY_HOPS = 1``, as it would behind a reverse proxy). With admission control the
+p99 of normal users should stay close to the baseline.
+
+The database is padded with ``--appointments`` rows so the availability
+query has a realistic cost.
+
+    python benchmarks/ratelimit_p99.py --duration 10 --abusive-threads 8
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_workdir = tempfile.mkdtemp(prefix='easybook-ratelimit-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'bench.db')}"
+
+from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+from config import Config  # noqa: E402
+from init_db import init_database  # noqa: E402
+from app import create_app  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def pad_appointments(count, doctor_id, day):
+    """Bulk-insert past appointments so availability lookups do real work"""
+    import sqlite3
+    from sqlalchemy import make_url
+    connection = sqlite3.connect(make_url(os.environ['DATABASE_URL']).database)
+    rows = ((f'BENCH{i:012d}', 1, doctor_id,
+             (day - timedelta(days=1 + i % 700)).isoformat(), '09:00:00.000000', 'completed')
+            for i in range(count))
+    connection.executemany(
+        'INSERT INTO appointments (reference_number, patient_id, doctor_id, appointment_date, '
+        'appointment_time, status) VALUES (?, ?, ?, ?, ?, ?)', rows)
+    connection.commit()
+    connection.close()
+
+
+def start_server(limits_enabled, store_path):
+    class BenchConfig(Config):
+        RATELIMIT_ENABLED = limits_enabled
+        RATELIMIT_STORAGE_PATH = store_path
+        TRUSTED_PROXY_HOPS = 1
+
+    app = create_app(BenchConfig)
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def client_loop(port, path, client_ip, interval, stop, latencies, statuses):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path, headers={'X-Forwarded-For': client_ip})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            status = 'error'
+        elapsed = time.perf_counter() - start
+        if latencies is not None and status == 200:
+            latencies.append(elapsed * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+        if interval:
+            stop.wait(interval)
+    connection.close()
+
+
+def run_scenario(name, limits_enabled, abusive_threads, args, path):
+    store_path = os.path.join(_workdir, f'ratelimit-{name}.db')
+    server = start_server(limits_enabled, store_path)
+    stop = threading.Event()
+    normal_latencies, normal_statuses, abusive_statuses = [], {}, {}
+    threads = [threading.Thread(target=client_loop, args=(
+        server.server_port, path, f'10.0.0.{i + 1}', args.normal_interval, stop,
+        normal_latencies, normal_statuses)) for i in range(args.normal_users)]
+    threads += [threading.Thread(target=client_loop, args=(
+        server.server_port, path, '10.9.9.9', 0, stop, None, abusive_statuses))
+        for _ in range(abusive_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    return {
+        'scenario': name,
+        'normal_requests_ok': len(normal_latencies),
+        'normal_statuses': normal_statuses,
+        'normal_ms_p50': round(statistics.median(normal_latencies), 2),
+        'normal_ms_p99': round(percentile(normal_latencies, 99), 2),
+        'abusive_statuses': abusive_statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per scenario.')
+    parser.add_argument('--normal-users', type=int, default=10)
+    parser.add_argument('--normal-interval', type=float, default=1.5,
+                        help='Seconds between requests of each normal user.')
+    parser.add_argument('--abusive-threads', type=int, default=8)
+    parser.add_argument('--appointments', type=int, default=200000,
+                        help='Rows added to make the availability query realistic.')
+    parser.add_argument('--json', metavar='PATH', help='Also write results to this file.')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_database()
+    day = date.today() + timedelta(days=(7 - date.today().weekday()))  # next Monday
+    path = f'/api/available-slots/1/{day.isoformat()}'
+    pad_appointments(args.appointments, 1, day)
+
+    results = [
+        run_scenario('baseline', True, 0, args, path),
+        run_scenario('abusive_unprotected', False, args.abusive_threads, args, path),
+        run_scenario('abusive_protected', True, args.abusive_threads, args, path),
+    ]
+    for row in results:
+        print(json.dumps(row))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Route latency benchmark at growing data sizes
+
+For each size a fresh SQLite database is filled with ``seed-synthetic`` data
+(app/seed.py), then the key routes are timed in-process with Flask's test
+client:
+
+- ``get_available_slots``   GET /api/available-slots/<doctor>/<date> on a busy day
+- ``book_appointment``      POST /book-appointment, a different free slot each time
+- ``patient_dashboard``     GET /patient/dashboard for a synthetic patient
+- ``admin_dashboard``       GET /admin/dashboard
+- ``admin_appointments``    GET /admin/appointments
+
+Results are written as JSON. Pass a previous result file with ``--baseline``
+to print the p50 change per size and route; the exit status is 1 when any
+route got slower than ``--threshold`` times its baseline.
+
+    python benchmarks/routes.py --sizes small medium
+    python benchmarks/routes.py --sizes small --baseline benchmarks/results/routes-old.json
+    python benchmarks/routes.py --sizes doctors=500,patients=1000000,appointments=10000000 \\
+        --skip admin_appointments
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from app import create_app  # noqa: E402
+from app.database import db  # noqa: E402
+from app.models import User  # noqa: E402
+from app.seed import SLOT_TIMES, seed_synthetic  # noqa: E402
+
+SIZES = {
+    'small': {'doctors': 20, 'patients': 2000, 'appointments': 20000},
+    'medium': {'doctors': 100, 'patients': 50000, 'appointments': 500000},
+    'large': {'doctors': 500, 'patients': 1000000, 'appointments': 10000000},
+}
+ROUTES = ['get_available_slots', 'book_appointment', 'patient_dashboard',
+          'admin_dashboard', 'admin_appointments']
+FUTURE_DAYS = 28
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def parse_size(value):
+    if value in SIZES:
+        return value, dict(SIZES[value])
+    size = dict(SIZES['small'])
+    for part in value.split(','):
+        key, _, number = part.partition('=')
+        if key not in size:
+            raise argparse.ArgumentTypeError(f'unknown size field {key!r}')
+        size[key] = int(number)
+    return value, size
+
+
+def next_weekday(day):
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+def free_slots(doctors):
+    """Endless (doctor_id, date, time) slots after the seeded bookings end"""
+    day = date.today() + timedelta(days=FUTURE_DAYS + 1)
+    while True:
+        day = next_weekday(day)
+        for doctor_id in doctors:
+            for slot in SLOT_TIMES:
+                yield doctor_id, day, slot
+        day += timedelta(days=1)
+
+
+def build_app(workdir, name):
+    path = os.path.join(workdir, f'{name}.db')
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+        RATELIMIT_ENABLED = False
+        CACHE_PATH = os.path.join(workdir, f'{name}-cache.db')
+
+    return create_app(BenchConfig), path
+
+
+def time_route(request, iterations, expected):
+    """Run ``request`` once to warm up, then time it ``iterations`` times"""
+    request()
+    samples, errors = [], 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = request()
+        samples.append((time.perf_counter() - start) * 1000)
+        if response.status_code != expected:
+            errors += 1
+    return {
+        'iterations': iterations,
+        'errors': errors,
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+def run_size(name, size, args, workdir):
+    app, path = build_app(workdir, name.replace('=', '-').replace(',', '_'))
+    started = time.perf_counter()
+    with app.app_context():
+        admin = User(username='admin', role='admin')
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        seed_synthetic(size['doctors'], size['patients'], size['appointments'],
+                       density=args.density, future_days=FUTURE_DAYS, seed=args.seed,
+                       batch_size=args.batch_size, progress=lambda message: None)
+        doctor_ids = [row[0] for row in db.session.execute(
+            db.text('SELECT id FROM doctors ORDER BY id LIMIT 5'))]
+    seed_seconds = time.perf_counter() - started
+
+    patient = app.test_client()
+    patient.post('/login', data={'username': 'synthetic1', 'password': 'patient123'})
+    admin = app.test_client()
+    admin.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    busy_day = next_weekday(date.today() + timedelta(days=1)).isoformat()
+    slots = free_slots(doctor_ids)
+
+    def book():
+        doctor_id, day, slot = next(slots)
+        return patient.post('/book-appointment', data={
+            'doctor_id': doctor_id, 'appointment_date': day.isoformat(),
+            'appointment_time': slot.strftime('%H:%M')})
+
+    requests = {
+        'get_available_slots': (
+            lambda: patient.get(f'/api/available-slots/{doctor_ids[0]}/{busy_day}'), 200),
+        'book_appointment': (book, 302),
+        'patient_dashboard': (lambda: patient.get('/patient/dashboard'), 200),
+        'admin_dashboard': (lambda: admin.get('/admin/dashboard'), 200),
+        'admin_appointments': (lambda: admin.get('/admin/appointments'), 200),
+    }
+
+    routes = {}
+    for route in ROUTES:
+        if route in args.skip:
+            continue
+        request, expected = requests[route]
+        routes[route] = time_route(request, args.iterations, expected)
+        print(f'  {route:22s} p50 {routes[route]["p50_ms"]:9.2f} ms   '
+              f'p95 {routes[route]["p95_ms"]:9.2f} ms   errors {routes[route]["errors"]}')
+
+    return dict(size, name=name, seed_seconds=round(seed_seconds, 2),
+                db_bytes=os.path.getsize(path), routes=routes)
+
+
+def compare(results, baseline, threshold):
+    """Print p50 ratios against a baseline run; returns the number of regressions"""
+    previous = {entry['name']: entry['routes'] for entry in baseline['sizes']}
+    regressions = 0
+    print(f'\nCompared with {baseline.get("started_at")} ({baseline.get("git_commit")}):')
+    for entry in results['sizes']:
+        for route, current in entry['routes'].items():
+            before = previous.get(entry['name'], {}).get(route)
+            if not before:
+                continue
+            ratio = current['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+            flag = 'REGRESSION' if ratio > threshold else ''
+            regressions += bool(flag)
+            print(f'  {entry["name"]:10s} {route:22s} {before["p50_ms"]:9.2f} -> '
+                  f'{current["p50_ms"]:9.2f} ms  x{ratio:.2f} {flag}')
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', nargs='+', type=parse_size,
+                        default=[parse_size('small'), parse_size('medium')],
+                        help='Preset names (small, medium, large) or '
+                             'doctors=N,patients=N,appointments=N.')
+    parser.add_argument('--iterations', type=int, default=20, help='Timed requests per route.')
+    parser.add_argument('--skip', nargs='*', default=[], choices=ROUTES, help='Routes to leave out.')
+    parser.add_argument('--density', type=float, default=0.6)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Result file (default benchmarks/results/routes-<time>.json).')
+    parser.add_argument('--baseline', help='Earlier result file to compare with.')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='p50 ratio above which a route counts as a regression.')
+    args = parser.parse_args()
+
+    started_at = datetime.now()
+    results = {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'iterations': args.iterations,
+        'sizes': [],
+    }
+    with tempfile.TemporaryDirectory(prefix='easybook-routes-') as workdir:
+        for name, size in args.sizes:
+            print(f'{name}: {size["doctors"]} doctors, {size["patients"]} patients, '
+                  f'{size["appointments"]} appointments')
+            results['sizes'].append(run_size(name, size, args, workdir))
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'results',
+        f'routes-{started_at:%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nResults written to {output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
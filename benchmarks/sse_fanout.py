@@ -0,0 +1,142 @@
+"""
+Fan-out benchmark for the live slot update broker (app/events.py)
+
+Measures, for growing numbers of idle subscribers on one (doctor, date)
+channel:
+
+- memory held per idle subscriber
+- time for one publish() to reach the channel
+- wake-up latency (p50/p99) from publish until each waiting consumer has the event
+
+Run with threads (default) or greenlets, which is how the SSE endpoint
+behaves under ``gunicorn -k gevent``:
+
+    python benchmarks/sse_fanout.py --subscribers 100 1000 10000
+    python benchmarks/sse_fanout.py --gevent --subscribers 1000 10000
+"""
+import argparse
+import sys
+
+if __name__ == '__main__' and '--gevent' in sys.argv:
+    from gevent import monkey
+    monkey.patch_all()
+
+import json
+import os
+import statistics
+import threading
+import time
+import tracemalloc
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.events import SlotBroker  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure_idle(count, repeats):
+    """Memory per idle subscriber and the cost of publishing to all of them"""
+    broker = SlotBroker()
+    day = date(2030, 1, 7)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscriptions = [broker.subscribe(1, day) for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        broker.publish(1, day, {'time': '09:00', 'available': i % 2 == 0})
+        timings.append(time.perf_counter() - start)
+
+    drain_start = time.perf_counter()
+    for subscription in subscriptions:
+        subscription.get(timeout=0)
+    drain = time.perf_counter() - drain_start
+
+    return {
+        'bytes_per_subscriber': round((after - before) / count),
+        'publish_ms_median': round(statistics.median(timings) * 1000, 3),
+        'drain_us_per_subscriber': round(drain / count * 1e6, 3),
+    }
+
+
+def measure_wakeup(count, use_gevent):
+    """Latency from publish until each blocked consumer has received the event"""
+    broker = SlotBroker()
+    day = date(2030, 1, 7)
+    subscriptions = [broker.subscribe(1, day) for _ in range(count)]
+    received = [None] * count
+    ready = threading.Barrier(count + 1) if not use_gevent else None
+
+    def consume(index):
+        if ready is not None:
+            ready.wait()
+        events = subscriptions[index].get(timeout=30)
+        if events:
+            received[index] = time.perf_counter()
+
+    if use_gevent:
+        import gevent
+        workers = [gevent.spawn(consume, i) for i in range(count)]
+        gevent.sleep(0.1)
+    else:
+        workers = [threading.Thread(target=consume, args=(i,), daemon=True)
+                   for i in range(count)]
+        for worker in workers:
+            worker.start()
+        ready.wait()
+        time.sleep(0.1)
+
+    published_at = time.perf_counter()
+    broker.publish(1, day, {'time': '09:00', 'available': False})
+
+    if use_gevent:
+        gevent.joinall(workers, timeout=30)
+    else:
+        for worker in workers:
+            worker.join(timeout=30)
+
+    latencies = [(t - published_at) * 1000 for t in received if t is not None]
+    return {
+        'delivered': len(latencies),
+        'wakeup_ms_p50': round(percentile(latencies, 50), 3) if latencies else None,
+        'wakeup_ms_p99': round(percentile(latencies, 99), 3) if latencies else None,
+        'wakeup_ms_max': round(max(latencies), 3) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--max-waiting-threads', type=int, default=2000,
+                        help='Skip the wake-up test above this many threads (not greenlets).')
+    parser.add_argument('--gevent', action='store_true', help='Use greenlets for consumers.')
+    parser.add_argument('--json', metavar='PATH', help='Also write results to this file.')
+    args = parser.parse_args()
+
+    results = []
+    for count in args.subscribers:
+        row = {'subscribers': count, 'mode': 'gevent' if args.gevent else 'threads'}
+        row.update(measure_idle(count, args.repeats))
+        if args.gevent or count <= args.max_waiting_threads:
+            row.update(measure_wakeup(count, args.gevent))
+        results.append(row)
+        print(json.dumps(row))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -44,6 +44,22 @@ class Config:
     SQLALCHEMY_DATABASE_URI = _database_url
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Optional read replicas, comma-separated URLs. GET requests read from a
+    # replica; writes and read-your-writes paths stay on the primary.
+    READ_REPLICA_URLS = [u.strip() for u in os.environ.get('READ_REPLICA_URLS', '').split(',') if u.strip()]
+    SQLALCHEMY_BINDS = {f'replica_{i}': url for i, url in enumerate(READ_REPLICA_URLS, 1)}
+    REPLICA_MAX_LAG_SECONDS = 5  # replicas further behind are skipped
+    REPLICA_LAG_CHECK_SECONDS = 1  # how long a lag measurement is reused
+    REPLICA_STICKY_SECONDS = 10  # clients read from the primary this long after writing
+    
+    # Reverse proxies in front of the app whose X-Forwarded-For/-Proto headers
+    # are trusted (0 = none). Client IPs for rate limiting depend on this.
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+    
+    # Multi-hospital tenancy (optional): JSON file mapping tenant keys to
+    # hosts/path prefixes, database URLs, pool sizes and config overrides
+    TENANTS_FILE = os.environ.get('TENANTS_FILE')
+    
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
     SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
@@ -54,6 +70,57 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     
+    # JSON implementation: auto (orjson when installed), orjson or stdlib
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+    
+    # Compression of HTML/JSON responses (static assets are pre-compressed by assets-build)
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024  # bytes
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 4
+    
+    # Cache shared by all workers on the host (SQLite file)
+    CACHE_ENABLED = os.environ.get('CACHE_ENABLED', '1') == '1'
+    CACHE_PATH = os.environ.get('CACHE_PATH')  # default: per-database file in a private per-user temp dir
+    CACHE_MAX_ENTRIES = 10000
+    CACHE_DEFAULT_TTL = 300  # seconds
+    
+    # Compiled templates kept on disk so new workers skip compilation
+    JINJA_BYTECODE_CACHE_ENABLED = os.environ.get('JINJA_BYTECODE_CACHE_ENABLED', '1') == '1'
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')  # default: per-user temp dir
+    
+    # Admission control: token buckets shared across workers through a SQLite
+    # file, plus a per-worker cap on requests in flight for each endpoint
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1') == '1'
+    RATELIMIT_STORAGE = os.environ.get('RATELIMIT_STORAGE', 'sqlite')  # 'sqlite' or 'memory'
+    RATELIMIT_STORAGE_PATH = os.environ.get('RATELIMIT_STORAGE_PATH') or os.path.join(tempfile.gettempdir(), 'easybook-ratelimit.db')
+    RATELIMIT_STORAGE_TIMEOUT = 0.1  # seconds to wait for the shared file's lock before admitting
+    RATELIMIT_RULES = {
+        'main.login': {'methods': ('POST',), 'per_minute': 10, 'burst': 5, 'max_concurrent': 4},
+        'main.get_available_slots': {'methods': ('GET',), 'per_minute': 60, 'burst': 20, 'max_concurrent': 16},
+    }
+    
+    # Appointment notifications (transactional outbox)
+    # 'file' (development only: messages hold patient details) or 'smtp';
+    # production defaults to smtp
+    NOTIFY_TRANSPORT = os.environ.get('NOTIFY_TRANSPORT') or (
+        'smtp' if os.environ.get('FLASK_ENV') == 'production' else 'file')
+    NOTIFY_FILE_PATH = os.environ.get('NOTIFY_FILE_PATH')  # default: notifications.log in the instance folder, mode 0600
+    SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+    SMTP_PORT = int(os.environ.get('SMTP_PORT', 1025))
+    SMTP_SENDER = os.environ.get('SMTP_SENDER', 'no-reply@easybook.local')
+    OUTBOX_BATCH_SIZE = 50
+    OUTBOX_CONCURRENCY = 4  # messages sent in parallel per worker
+    OUTBOX_MAX_ATTEMPTS = 5
+    OUTBOX_POLL_SECONDS = 2
+    
+    # Live slot updates (Server-Sent Events). 'auto' streams only under a
+    # cooperative worker (gunicorn -k gevent); otherwise booking forms poll.
+    SSE_ENABLED = os.environ.get('SSE_ENABLED', 'auto')  # 'auto', '1' or '0'
+    SLOT_POLL_SECONDS = 15
+    SSE_HEARTBEAT_SECONDS = 20
+    SSE_MAX_STREAM_SECONDS = 300  # clients reconnect automatically after this
+    
     # Hospital information
     HOSPITAL_NAME = "St. Mary's Hospital - Easybook System"
     HOSPITAL_OPERATING_HOURS = "Monday - Friday: 8:00 AM - 6:00 PM, Saturday: 9:00 AM - 3:00 PM"
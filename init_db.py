@@ -5,6 +5,7 @@ Run this file to create the database and populate it with initial data
 from datetime import datetime, time, date, timedelta
 from app import create_app
 from app.database import db
+from app.cache import get_cache
 from app.models import User, Patient, Specialty, Doctor, Schedule, Appointment
 
 def init_database():
@@ -16,6 +17,7 @@ def init_database():
         print("Creating database tables...")
         db.drop_all()
         db.create_all()
+        get_cache().clear()
         
         # Create admin user
         print("Creating admin user...")
@@ -12,6 +12,76 @@ document.addEventListener("DOMContentLoaded", function () {
   });
 });
 
+// Path prefix the app is mounted under (e.g. a hospital's /<tenant> prefix);
+// every API URL must start with it
+function apiUrl(path) {
+  return (document.body.dataset.apiBase || "") + path;
+}
+
+// Booking page bootstrap - specialties, doctors and weekly schedules inlined
+// into the page (or fetched once from /api/booking-bootstrap)
+let bookingBootstrap = null;
+
+function readBookingBootstrap() {
+  const script = document.getElementById("booking-bootstrap");
+  if (!script) return null;
+  try {
+    return JSON.parse(script.textContent);
+  } catch (error) {
+    console.error("Error reading booking data:", error);
+    return null;
+  }
+}
+
+const WEEKDAYS = [
+  "Sunday",
+  "Monday",
+  "Tuesday",
+  "Wednesday",
+  "Thursday",
+  "Friday",
+  "Saturday",
+];
+
+// Day name for a YYYY-MM-DD string, in local time like the date input
+function weekdayOf(dateStr) {
+  const [year, month, day] = dateStr.split("-").map(Number);
+  return WEEKDAYS[new Date(year, month - 1, day).getDay()];
+}
+
+function pad2(n) {
+  return String(n).padStart(2, "0");
+}
+
+// Decode /api/available-slots/...?format=compact into {"YYYY-MM-DD": ["HH:MM", ...]}.
+// Each day is a list of [startMinute, step, runs] blocks; runs alternate
+// counts of free and booked slots, starting with free.
+function decodeCompactSlots(payload) {
+  const [year, month, day] = payload.start.split("-").map(Number);
+  const slotsByDate = {};
+
+  payload.days.forEach((blocks, offset) => {
+    const d = new Date(year, month - 1, day + offset);
+    const key = `${d.getFullYear()}-${pad2(d.getMonth() + 1)}-${pad2(d.getDate())}`;
+    const slots = [];
+
+    blocks.forEach(([start, step, runs]) => {
+      let minute = start;
+      runs.forEach((count, i) => {
+        if (i % 2 === 0) {
+          for (let k = 0; k < count; k++) {
+            const m = minute + k * step;
+            slots.push(`${pad2(Math.floor(m / 60))}:${pad2(m % 60)}`);
+          }
+        }
+        minute += count * step;
+      });
+    });
+    slotsByDate[key] = slots;
+  });
+  return slotsByDate;
+}
+
 // Appointment Booking - Load doctors by specialty
 function loadDoctorsBySpecialty() {
   const specialtySelect = document.getElementById("specialty");
@@ -19,6 +89,14 @@ function loadDoctorsBySpecialty() {
 
   if (!specialtySelect || !doctorSelect) return;
 
+  async function fetchDoctors(specialtyId) {
+    if (bookingBootstrap) {
+      return bookingBootstrap.doctors_by_specialty[specialtyId] || [];
+    }
+    const response = await fetch(apiUrl(`/api/doctors/${specialtyId}`));
+    return response.json();
+  }
+
   specialtySelect.addEventListener("change", async function () {
     const specialtyId = this.value;
     doctorSelect.innerHTML = '<option value="">Select a doctor</option>';
@@ -29,8 +107,7 @@ function loadDoctorsBySpecialty() {
     }
 
     try {
-      const response = await fetch(`/api/doctors/${specialtyId}`);
-      const doctors = await response.json();
+      const doctors = await fetchDoctors(specialtyId);
 
       if (doctors.length === 0) {
         doctorSelect.innerHTML =
@@ -63,6 +140,120 @@ function loadAvailableSlots() {
 
   if (!doctorSelect || !dateInput || !timeSelect) return;
 
+  // Whether the doctor works on that weekday; unknown without bootstrap data
+  function worksOn(doctorId, date) {
+    if (!bookingBootstrap) return true;
+    const days = bookingBootstrap.schedules[doctorId] || {};
+    return (days[weekdayOf(date)] || []).length > 0;
+  }
+
+  // Free slots for the next week are fetched in one compact request, so
+  // moving between nearby dates needs no further round trips
+  const SLOT_WINDOW_DAYS = 7;
+  const SLOT_WINDOW_MAX_AGE = 30000; // ms
+  let slotWindow = null;
+
+  async function slotsFor(doctorId, date) {
+    const fresh =
+      slotWindow &&
+      slotWindow.doctorId === doctorId &&
+      Date.now() - slotWindow.fetchedAt < SLOT_WINDOW_MAX_AGE;
+
+    if (!fresh || !(date in slotWindow.slots)) {
+      const response = await fetch(
+        apiUrl(
+          `/api/available-slots/${doctorId}/${date}?format=compact&days=${SLOT_WINDOW_DAYS}`
+        )
+      );
+      if (!response.ok) throw new Error(`HTTP ${response.status}`);
+      slotWindow = {
+        doctorId: doctorId,
+        fetchedAt: Date.now(),
+        slots: decodeCompactSlots(await response.json()),
+      };
+    }
+    return slotWindow.slots[date];
+  }
+
+  let slotEvents = null;
+  let slotPoll = null;
+
+  function stopWatching() {
+    if (slotEvents) slotEvents.close();
+    if (slotPoll) clearInterval(slotPoll);
+    slotEvents = null;
+    slotPoll = null;
+  }
+
+  // Drop a slot another patient booked or bring back one that was freed
+  function applySlotChange(change) {
+    const existing = timeSelect.querySelector(
+      `option[value="${change.time}"]`
+    );
+
+    if (!change.available && existing) {
+      if (existing.selected) {
+        alert(
+          `The ${change.time} slot was just booked by someone else. Please choose another time.`
+        );
+      }
+      existing.remove();
+    } else if (change.available && !existing) {
+      const option = document.createElement("option");
+      option.value = change.time;
+      option.textContent = change.time;
+      const later = Array.from(timeSelect.options).find(
+        (o) => o.value && o.value > change.time
+      );
+      timeSelect.options[0].textContent = "Select time";
+      timeSelect.insertBefore(option, later || null);
+      timeSelect.disabled = false;
+    }
+  }
+
+  // Re-read the free slots and apply whatever changed since the list was built
+  async function refreshSlots(doctorId, date) {
+    slotWindow = null;
+    try {
+      const slots = await slotsFor(doctorId, date);
+      if (doctorSelect.value !== doctorId || dateInput.value !== date) return;
+      const free = new Set(slots);
+      Array.from(timeSelect.options).forEach((option) => {
+        if (option.value && !free.has(option.value)) {
+          applySlotChange({ time: option.value, available: false });
+        }
+      });
+      slots.forEach((slot) => applySlotChange({ time: slot, available: true }));
+    } catch (error) {
+      console.error("Error refreshing slots:", error);
+    }
+  }
+
+  // Keep the time list live while the form is open. Slot events are streamed
+  // when the server runs a cooperative worker; otherwise the list is polled.
+  function watchSlots(doctorId, date) {
+    stopWatching();
+
+    if (timeSelect.dataset.slotUpdates === "events" && window.EventSource) {
+      slotEvents = new EventSource(
+        apiUrl(`/api/slot-events/${doctorId}/${date}`)
+      );
+      slotEvents.addEventListener("slot", function (event) {
+        const change = JSON.parse(event.data);
+        slotWindow = null;
+        // The server could not replay what was missed; reload the whole list
+        if (change.resync) refreshSlots(doctorId, date);
+        else applySlotChange(change);
+      });
+      return;
+    }
+
+    const seconds = Number(timeSelect.dataset.pollSeconds) || 0;
+    if (seconds > 0) {
+      slotPoll = setInterval(() => refreshSlots(doctorId, date), seconds * 1000);
+    }
+  }
+
   async function updateSlots() {
     const doctorId = doctorSelect.value;
     const date = dateInput.value;
@@ -70,13 +261,23 @@ function loadAvailableSlots() {
     timeSelect.innerHTML = '<option value="">Select time</option>';
 
     if (!doctorId || !date) {
+      stopWatching();
+      timeSelect.disabled = true;
+      return;
+    }
+
+    // Skip the round trip entirely when the doctor has no schedule that day
+    if (!worksOn(doctorId, date)) {
+      stopWatching();
+      timeSelect.innerHTML = '<option value="">No slots available</option>';
       timeSelect.disabled = true;
       return;
     }
 
+    watchSlots(doctorId, date);
+
     try {
-      const response = await fetch(`/api/available-slots/${doctorId}/${date}`);
-      const slots = await response.json();
+      const slots = await slotsFor(doctorId, date);
 
       if (slots.length === 0) {
         timeSelect.innerHTML = '<option value="">No slots available</option>';
@@ -130,6 +331,7 @@ document.addEventListener("DOMContentLoaded", function () {
 
 // Initialize all functions
 document.addEventListener("DOMContentLoaded", function () {
+  bookingBootstrap = readBookingBootstrap();
   loadDoctorsBySpecialty();
   loadAvailableSlots();
   setMinimumDate();
@@ -190,6 +392,68 @@ function searchTable(inputId, tableId) {
   });
 }
 
+// Server-side search (admin) - queries /api/search instead of filtering the DOM
+function serverSearch(inputId, resultsId) {
+  const input = document.getElementById(inputId);
+  const results = document.getElementById(resultsId);
+
+  if (!input || !results) return;
+
+  let timer = null;
+  let controller = null;
+
+  function describe(item) {
+    if (item.type === "appointment") {
+      return `${item.reference_number} - ${item.patient_name} (${item.phone}) with ${item.doctor_name}, ${item.appointment_date} ${item.appointment_time} [${item.status}]`;
+    }
+    if (item.type === "doctor") {
+      return `Doctor: ${item.name}${item.phone ? " (" + item.phone + ")" : ""}`;
+    }
+    return `Patient: ${item.name} (${item.phone})${item.email ? " - " + item.email : ""}`;
+  }
+
+  async function runSearch() {
+    const query = input.value.trim();
+    results.innerHTML = "";
+    if (query.length < 2) return;
+
+    if (controller) controller.abort();
+    controller = new AbortController();
+
+    try {
+      const response = await fetch(
+        apiUrl(`/api/search?q=${encodeURIComponent(query)}&per_page=20`),
+        { signal: controller.signal }
+      );
+      const data = await response.json();
+
+      if (data.results.length === 0) {
+        results.innerHTML = "<li>No matches found</li>";
+        return;
+      }
+
+      data.results.forEach((item) => {
+        const li = document.createElement("li");
+        li.textContent = describe(item);
+        results.appendChild(li);
+      });
+    } catch (error) {
+      if (error.name !== "AbortError") {
+        console.error("Error searching:", error);
+      }
+    }
+  }
+
+  input.addEventListener("input", function () {
+    clearTimeout(timer);
+    timer = setTimeout(runSearch, 200);
+  });
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+  serverSearch("serverSearchInput", "serverSearchResults");
+});
+
 // Print functionality
 function printTable(tableId) {
   const table = document.getElementById(tableId);
@@ -0,0 +1,66 @@
+import os
+import sys
+from datetime import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from app import create_app  # noqa: E402
+from app.database import db  # noqa: E402
+from app.models import User, Patient, Specialty, Doctor, Schedule  # noqa: E402
+
+WORKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+
+@pytest.fixture
+def config(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        SQLALCHEMY_BINDS = {}
+        CACHE_ENABLED = False
+        RATELIMIT_ENABLED = False
+        JINJA_BYTECODE_CACHE_ENABLED = False
+        TENANTS_FILE = None
+
+    return TestConfig
+
+
+@pytest.fixture
+def app(config):
+    app = create_app(config)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def doctor(app):
+    """A doctor working 09:00-12:00 and 14:00-17:00 in 30 minute slots on weekdays"""
+    specialty = Specialty(name='General Medicine')
+    doctor = Doctor(name='Dr. Test', specialty=specialty, qualification='MD')
+    db.session.add(doctor)
+    for day in WORKDAYS:
+        for start, end in ((time(9), time(12)), (time(14), time(17))):
+            db.session.add(Schedule(doctor=doctor, day_of_week=day, start_time=start,
+                                    end_time=end, slot_duration=30, is_active=True))
+    db.session.commit()
+    return doctor
+
+
+@pytest.fixture
+def patient(app):
+    user = User(username='patient', role='patient')
+    user.set_password('patient123')
+    patient = Patient(user=user, full_name='Test Patient', phone='0911234567')
+    db.session.add(patient)
+    db.session.commit()
+    return patient
@@ -0,0 +1,90 @@
+from datetime import date, time
+
+import pytest
+from sqlalchemy import select
+
+from app import bulk
+from app.database import db
+from app.models import User, Appointment, Doctor, OutboxMessage, Schedule
+
+MONDAY = date(2030, 1, 7)
+
+
+@pytest.fixture
+def bookings(app, doctor, patient):
+    """Scheduled Monday to Wednesday, plus one completed and one cancelled on Monday"""
+    rows = [Appointment(reference_number=f'BULK{n}', patient=patient, doctor=doctor,
+                        appointment_date=day, appointment_time=at, status=status)
+            for n, (day, at, status) in enumerate([
+                (MONDAY, time(9), 'scheduled'),
+                (MONDAY, time(9, 30), 'completed'),
+                (MONDAY, time(10), 'cancelled'),
+                (date(2030, 1, 8), time(9), 'scheduled'),
+                (date(2030, 1, 9), time(9), 'scheduled'),
+            ])]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def statuses():
+    return dict(db.session.execute(
+        select(Appointment.reference_number, Appointment.status)).all())
+
+
+def test_cancel_doctor_appointments_counts_only_scheduled_in_range(doctor, bookings):
+    counts = bulk.cancel_doctor_appointments(doctor.id, MONDAY, date(2030, 1, 8))
+
+    assert counts == {'cancelled': 2, 'notifications': 2}
+    assert statuses() == {'BULK0': 'cancelled', 'BULK1': 'completed', 'BULK2': 'cancelled',
+                          'BULK3': 'cancelled', 'BULK4': 'scheduled'}
+    queued = db.session.execute(select(OutboxMessage.appointment_id, OutboxMessage.kind)).all()
+    assert sorted(queued) == [(bookings[0].id, 'cancellation'), (bookings[3].id, 'cancellation')]
+
+
+def test_complete_appointments_skips_rows_that_are_not_scheduled(bookings):
+    counts = bulk.complete_appointments([b.id for b in bookings[:3]])
+
+    assert counts == {'completed': 1}
+    assert statuses()['BULK0'] == 'completed'
+    assert statuses()['BULK2'] == 'cancelled'
+    assert bulk.complete_appointments([]) == {'completed': 0}
+
+
+def test_deactivate_doctor_counts_each_table(doctor, bookings):
+    counts = bulk.deactivate_doctor(doctor.id, today=date(2030, 1, 8))
+
+    assert counts == {'doctors': 1, 'schedules': 10, 'cancelled': 2, 'notifications': 2}
+    assert statuses()['BULK0'] == 'scheduled'  # before ``today``
+    assert not db.session.get(Doctor, doctor.id).is_active
+    assert bulk.deactivate_doctor(doctor.id, today=date(2030, 1, 8)) == {
+        'doctors': 0, 'schedules': 0, 'cancelled': 0, 'notifications': 0}
+
+
+@pytest.fixture
+def admin(app, client):
+    user = User(username='admin', role='admin')
+    user.set_password('admin123')
+    db.session.add(user)
+    db.session.commit()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
+
+
+def test_deleting_an_inactive_doctor_reports_the_cleanup(admin, doctor, bookings):
+    doctor.is_active = False
+    db.session.commit()
+
+    response = admin.post('/admin/doctors', data={'action': 'delete', 'doctor_id': doctor.id},
+                          follow_redirects=True)
+    page = response.get_data(as_text=True)
+
+    assert 'Doctor was already inactive; 10 schedule(s) deactivated' in page
+    assert Schedule.query.filter_by(is_active=True).count() == 0
+
+
+def test_deleting_a_fully_inactive_doctor(admin, doctor):
+    bulk.deactivate_doctor(doctor.id)
+    response = admin.post('/admin/doctors', data={'action': 'delete', 'doctor_id': doctor.id},
+                          follow_redirects=True)
+    assert 'Doctor is already inactive.' in response.get_data(as_text=True)
@@ -0,0 +1,101 @@
+import os
+import stat
+import threading
+
+import pytest
+
+from app import cache
+from app.cache import SharedCache, private_dir
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SharedCache(str(tmp_path / 'cache.db'))
+
+
+def test_values_round_trip_as_json(shared):
+    value = {'specialties': [{'id': 1, 'name': 'Cardiology'}], 'schedules': {'3': {}}}
+    shared.set('bootstrap', value)
+    assert shared.get('bootstrap') == value
+    stored = shared._connect().execute("SELECT value FROM entries").fetchone()[0]
+    assert stored.startswith('{"specialties"')
+
+
+def test_unreadable_entries_are_misses(shared):
+    shared._connect().execute(
+        "INSERT INTO entries VALUES ('old', ?, 1e12, 0)", (b'\x80\x04\x95pickled',))
+    assert shared.get('old', 'missing') == 'missing'
+
+
+def test_expired_entries_are_misses(shared):
+    shared.set('key', 'value', ttl=-1)
+    assert shared.get('key') is None
+
+
+def test_bump_changes_dependent_keys(app, shared):
+    app.extensions['cache'] = shared
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.memoize('doctors:1', compute, depends_on=('doctors',)) == 1
+    assert cache.memoize('doctors:1', compute, depends_on=('doctors',)) == 1
+    cache.invalidate('schedules')
+    assert cache.memoize('doctors:1', compute, depends_on=('doctors',)) == 1
+    cache.invalidate('doctors')
+    assert cache.memoize('doctors:1', compute, depends_on=('doctors',)) == 2
+    assert cache.versioned_key('doctors:1', ('doctors',)).endswith('|doctors=1')
+
+
+def test_lease_lets_one_caller_compute(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    SharedCache(path)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'fresh'
+
+    def worker(compute):
+        # One store per thread, like separate worker processes
+        results.append(SharedCache(path).get_or_compute('hot', compute, poll_interval=0.01))
+
+    first = threading.Thread(target=worker, args=(slow,))
+    first.start()
+    assert started.wait(5)
+    waiters = [threading.Thread(target=worker, args=(slow,)) for _ in range(3)]
+    for thread in waiters:
+        thread.start()
+    release.set()
+    for thread in [first] + waiters:
+        thread.join(10)
+
+    assert calls == [1]
+    assert results == ['fresh'] * 4
+
+
+def test_expired_lease_can_be_taken_over(shared):
+    assert shared._acquire_lease('key', 10)
+    assert not shared._acquire_lease('key', 10)
+    assert shared._acquire_lease('other', 10)
+    shared._connect().execute("UPDATE leases SET expires_at = 0 WHERE key = 'key'")
+    assert shared._acquire_lease('key', 10)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX permissions')
+def test_private_dir_is_owner_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache.tempfile, 'gettempdir', lambda: str(tmp_path))
+    path = private_dir('easybook-test')
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o700
+    assert private_dir('easybook-test') == path
+
+    os.chmod(path, 0o755)
+    with pytest.raises(RuntimeError):
+        private_dir('easybook-test')
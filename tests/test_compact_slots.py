@@ -0,0 +1,113 @@
+"""Round trips of the compact availability format through both decoders"""
+import json
+import os
+import shutil
+import subprocess
+from datetime import date, time, timedelta
+
+import pytest
+
+from app.database import db
+from app.models import Appointment, Doctor, Specialty
+from app.routes import _free_runs, compact_availability
+
+MAIN_JS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'static', 'js', 'main.js')
+
+# Runs main.js with a stub DOM and decodes the payload given on stdin
+NODE_DECODER = """
+const fs = require("fs");
+const vm = require("vm");
+const context = {
+  console,
+  window: {},
+  document: { addEventListener() {}, getElementById() { return null; } },
+};
+vm.createContext(context);
+vm.runInContext(fs.readFileSync(process.argv[1], "utf8"), context);
+const payload = JSON.parse(fs.readFileSync(0, "utf8"));
+process.stdout.write(JSON.stringify(context.decodeCompactSlots(payload)));
+"""
+
+
+def decode(payload):
+    """Python mirror of ``decodeCompactSlots`` in main.js"""
+    start = date.fromisoformat(payload['start'])
+    slots_by_date = {}
+    for offset, blocks in enumerate(payload['days']):
+        slots = []
+        for minute, step, runs in blocks:
+            for i, count in enumerate(runs):
+                if i % 2 == 0:
+                    slots += [f'{m // 60:02d}:{m % 60:02d}'
+                              for m in range(minute, minute + count * step, step)]
+                minute += count * step
+        slots_by_date[(start + timedelta(days=offset)).isoformat()] = slots
+    return slots_by_date
+
+
+def decode_in_node(payload):
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip('node is not installed')
+    result = subprocess.run([node, '-e', NODE_DECODER, MAIN_JS], input=json.dumps(payload),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def book(doctor, patient, day, at, status='scheduled'):
+    db.session.add(Appointment(reference_number=f'T{day:%m%d}{at:%H%M}{status[0]}',
+                               patient=patient, doctor=doctor, appointment_date=day,
+                               appointment_time=at, status=status))
+
+
+def test_free_runs_start_with_free():
+    assert _free_runs(540, 720, 30, set()) == [6]
+    assert _free_runs(540, 720, 30, {540}) == [0, 1, 5]
+    assert _free_runs(540, 720, 30, {570, 600, 690}) == [1, 2, 2, 1]
+    assert _free_runs(540, 720, 30, set(range(540, 720, 30))) == [0, 6]
+
+
+def test_first_slot_booked(app, doctor, patient):
+    monday = date(2030, 1, 7)
+    book(doctor, patient, monday, time(9, 0))
+    db.session.commit()
+
+    payload = compact_availability(doctor.id, monday, 1)
+    assert payload['days'] == [[[540, 30, [0, 1, 5]], [840, 30, [6]]]]
+    assert decode(payload)['2030-01-07'][0] == '09:30'
+
+
+def test_empty_schedule(app):
+    doctor = Doctor(name='Dr. Nobody', specialty=Specialty(name='Dermatology'))
+    db.session.add(doctor)
+    db.session.commit()
+
+    payload = compact_availability(doctor.id, date(2030, 1, 7), 3)
+    assert payload == {'start': '2030-01-07', 'days': [[], [], []]}
+    assert decode(payload) == {'2030-01-07': [], '2030-01-08': [], '2030-01-09': []}
+    assert decode_in_node(payload) == decode(payload)
+
+
+def test_days_across_month_boundary_match_the_plain_route(app, client, doctor, patient):
+    start = date(2030, 1, 30)  # Wednesday; the window ends on Monday 4 February
+    book(doctor, patient, date(2030, 1, 30), time(9, 0))
+    book(doctor, patient, date(2030, 1, 31), time(11, 30))
+    book(doctor, patient, date(2030, 2, 1), time(14, 0))
+    book(doctor, patient, date(2030, 2, 1), time(14, 30))
+    book(doctor, patient, date(2030, 2, 4), time(16, 30))
+    book(doctor, patient, date(2030, 2, 4), time(10, 0), status='cancelled')
+    db.session.commit()
+
+    response = client.get(f'/api/available-slots/{doctor.id}/{start}?format=compact&days=6')
+    payload = response.get_json()
+    expected = {}
+    for offset in range(6):
+        day = (start + timedelta(days=offset)).isoformat()
+        expected[day] = client.get(f'/api/available-slots/{doctor.id}/{day}').get_json()
+
+    assert list(expected) == ['2030-01-30', '2030-01-31', '2030-02-01', '2030-02-02',
+                              '2030-02-03', '2030-02-04']
+    assert expected['2030-02-02'] == [] and expected['2030-02-03'] == []
+    assert decode(payload) == expected
+    assert decode_in_node(payload) == expected
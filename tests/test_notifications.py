@@ -0,0 +1,112 @@
+import json
+import os
+import stat
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app import create_app
+from app.database import db
+from app.models import Appointment, Doctor, OutboxMessage, Patient, Specialty, User
+from app.notifications import FileTransport, claim_batch
+from app.tenancy import tenant_context
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX permissions')
+def test_file_transport_is_owner_only(tmp_path):
+    path = tmp_path / 'outbox' / 'notifications.log'
+    transport = FileTransport(str(path))
+    transport.send({'channel': 'email', 'to': 'patient@example.com', 'subject': 'Booked'})
+    transport.send({'channel': 'sms', 'to': '+251911234567', 'subject': 'Booked'})
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line['to'] for line in lines] == ['patient@example.com', '+251911234567']
+
+
+def test_default_file_path_is_in_the_instance_folder(app):
+    assert app.config['NOTIFY_FILE_PATH'] == os.path.join(app.instance_path, 'notifications.log')
+
+
+def _due_messages(count, appointment):
+    past = datetime.utcnow() - timedelta(seconds=1)
+    messages = [OutboxMessage(kind='confirmation', appointment=appointment, status='pending',
+                              next_attempt_at=past) for _ in range(count)]
+    db.session.add_all(messages)
+    db.session.commit()
+    return [m.id for m in messages]
+
+
+@pytest.fixture
+def appointment(app, doctor, patient):
+    appointment = Appointment(reference_number='TCLAIM', patient=patient, doctor=doctor,
+                              appointment_date=date(2030, 1, 7), appointment_time=time(9))
+    db.session.add(appointment)
+    db.session.commit()
+    return appointment
+
+
+def test_claim_batch_claims_due_messages_once(app, appointment):
+    ids = _due_messages(3, appointment)
+    assert sorted(m.id for m in claim_batch(10)) == ids
+    assert claim_batch(10) == []
+
+
+def test_claim_batch_skips_rows_claimed_after_its_select(app, appointment, monkeypatch):
+    """A second worker claiming between our SELECT and UPDATE wins those rows"""
+    ids = _due_messages(3, appointment)
+    execute = db.session.execute
+    raced = []
+
+    def execute_with_rival(statement, *args, **kwargs):
+        if getattr(statement, 'is_dml', False) and not raced:
+            raced.append(True)
+            # The rival worker's claim commits first on its own connection
+            with db.engine.begin() as connection:
+                connection.execute(update(OutboxMessage).where(OutboxMessage.id == ids[0])
+                                   .values(status='sending',
+                                           next_attempt_at=datetime(2100, 1, 1)))
+        return execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(db.session, 'execute', execute_with_rival)
+    claimed = claim_batch(10)
+
+    assert raced
+    assert sorted(m.id for m in claimed) == ids[1:]
+
+
+def test_commands_use_the_tenant_database_and_settings(config, tmp_path):
+    config.TENANTS = {'north': {
+        'hosts': ['north.example.org'],
+        'database_url': f"sqlite:///{tmp_path / 'north.db'}",
+        'config': {'HOSPITAL_NAME': 'North Clinic'},
+    }}
+    config.NOTIFY_TRANSPORT = 'file'
+    config.NOTIFY_FILE_PATH = str(tmp_path / 'notifications.log')
+    app = create_app(config)
+    with tenant_context(app, 'north'):
+        doctor = Doctor(name='Dr. North', specialty=Specialty(name='Cardiology'),
+                        qualification='MD')
+        user = User(username='north', role='patient')
+        user.set_password('north123')
+        patient = Patient(user=user, full_name='North Patient', phone='0911000000')
+        db.session.add(Appointment(reference_number='TNORTH', patient=patient, doctor=doctor,
+                                   appointment_date=date(2030, 1, 7), appointment_time=time(9)))
+        db.session.commit()
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['enqueue-reminders', '--tenant', 'north', '--date', '2030-01-07'])
+    assert 'Queued 1 reminders' in result.output
+    result = runner.invoke(args=['outbox-worker', '--once', '--tenant', 'north'])
+    assert result.exit_code == 0, result.output
+
+    with open(config.NOTIFY_FILE_PATH, encoding='utf-8') as f:
+        sent = [json.loads(line) for line in f]
+    assert len(sent) == 1
+    assert 'North Patient' in sent[0]['body'] and 'North Clinic' in sent[0]['body']
+    with app.app_context():
+        assert OutboxMessage.query.count() == 0
+
+    result = runner.invoke(args=['search-reindex', '--tenant', 'south'])
+    assert result.exit_code != 0 and 'unknown tenant' in result.output
@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import text
+
+from app import create_app, search
+from app.database import db
+from app.phone import normalize_phone, reversed_digits, suffix_range
+
+
+@pytest.mark.parametrize('typed, normalized', [
+    ('0911 234 567', '+251911234567'),
+    ('251911234567', '+251911234567'),
+    ('+251-911-234-567', '+251911234567'),
+    ('(0911) 23-45-67', '+251911234567'),
+    ('911234567', '+251911234567'),
+    ('711234567', '+251711234567'),
+    ('+1 555 0100', '+15550100'),
+    ('5550100', '5550100'),
+    ('', None),
+    (None, None),
+    ('ext.', None),
+])
+def test_normalize_phone(typed, normalized):
+    assert normalize_phone(typed) == normalized
+
+
+def test_reversed_digits():
+    assert reversed_digits('+251911234567') == '765432119152'
+    assert reversed_digits('') is None
+
+
+@pytest.mark.parametrize('suffix, bounds', [
+    ('4567', ('7654', '7655')),
+    ('34-99', ('9943', '9944')),
+    ('9909', ('9099', '91')),
+    ('9999', ('9999', None)),
+])
+def test_suffix_range(suffix, bounds):
+    assert suffix_range(suffix) == bounds
+
+
+def test_suffix_range_covers_exactly_the_matching_numbers():
+    numbers = ['+251911239999', '+251911234999', '+251911230999', '+251911240000']
+    low, high = suffix_range('999')
+    matched = [n for n in numbers
+               if reversed_digits(n) >= low and (high is None or reversed_digits(n) < high)]
+    assert matched == [n for n in numbers if n.endswith('999')]
+
+
+def _downgrade_to_plain_phone_column(app):
+    """Turn the test database into one created before the normalized phone columns"""
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP TABLE search_index'))
+        for index in db.Model.metadata.tables['patients'].indexes:
+            connection.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+        connection.execute(text('ALTER TABLE patients DROP COLUMN phone_normalized'))
+        connection.execute(text('ALTER TABLE patients DROP COLUMN phone_reversed'))
+    db.session.remove()
+    db.engine.dispose()
+
+
+def test_upgrade_then_backfill_makes_patients_searchable(app, config, patient, capsys):
+    patient_id = patient.id
+    _downgrade_to_plain_phone_column(app)
+    upgraded = create_app(config)
+    with upgraded.app_context():
+        assert db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'search_index'")).first() is None
+        assert 'phone-backfill' in capsys.readouterr().err
+
+        result = upgraded.test_cli_runner().invoke(args=['phone-backfill'])
+        assert result.exit_code == 0, result.output
+        assert 'Search index rebuilt.' in result.output
+        results, _ = search.search('test')
+        assert [r['id'] for r in results] == [patient_id]
+        assert search.search('+251911234567')[0]
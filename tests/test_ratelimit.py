@@ -0,0 +1,73 @@
+import logging
+import sqlite3
+
+import pytest
+
+from app.ratelimit import MemoryStore, SQLiteStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStore()
+    return SQLiteStore(str(tmp_path / 'buckets.db'))
+
+
+def test_burst_then_refused(store):
+    now = 1000.0
+    for _ in range(3):
+        assert store.take('client', rate=1, burst=3, now=now) == (True, 0)
+    allowed, retry_after = store.take('client', rate=1, burst=3, now=now)
+    assert not allowed
+    assert retry_after == pytest.approx(1)
+
+
+def test_refills_at_rate(store):
+    now = 1000.0
+    for _ in range(2):
+        store.take('client', rate=0.5, burst=2, now=now)
+    allowed, retry_after = store.take('client', rate=0.5, burst=2, now=now + 1)
+    assert not allowed
+    assert retry_after == pytest.approx(1)  # half a token left to earn at 0.5/s
+    assert store.take('client', rate=0.5, burst=2, now=now + 2)[0]
+    assert not store.take('client', rate=0.5, burst=2, now=now + 2)[0]
+
+
+def test_refill_is_capped_at_burst(store):
+    now = 1000.0
+    store.take('client', rate=10, burst=2, now=now)
+    later = now + 3600
+    assert store.take('client', rate=10, burst=2, now=later)[0]
+    assert store.take('client', rate=10, burst=2, now=later)[0]
+    assert not store.take('client', rate=10, burst=2, now=later)[0]
+
+
+def test_keys_are_independent(store):
+    now = 1000.0
+    assert store.take('a', rate=1, burst=1, now=now)[0]
+    assert not store.take('a', rate=1, burst=1, now=now)[0]
+    assert store.take('b', rate=1, burst=1, now=now)[0]
+
+
+def test_sqlite_buckets_are_shared_between_stores(tmp_path):
+    path = str(tmp_path / 'buckets.db')
+    first, second = SQLiteStore(path), SQLiteStore(path)
+    assert first.take('client', rate=1, burst=1, now=1000.0)[0]
+    assert not second.take('client', rate=1, burst=1, now=1000.0)[0]
+
+
+def test_sqlite_store_fails_open_when_locked(tmp_path, caplog):
+    path = str(tmp_path / 'buckets.db')
+    store = SQLiteStore(path, timeout=0.01)
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute('BEGIN EXCLUSIVE')
+    try:
+        with caplog.at_level(logging.WARNING, logger='app.ratelimit'):
+            assert store.take('client', rate=1, burst=1, now=1000.0) == (True, 0)
+    finally:
+        holder.execute('ROLLBACK')
+        holder.close()
+    assert 'admitting request' in caplog.text
+    # The store works again once the lock is gone
+    assert store.take('client', rate=1, burst=1, now=1000.0) == (True, 0)
+    assert not store.take('client', rate=1, burst=1, now=1000.0)[0]
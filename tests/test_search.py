@@ -0,0 +1,108 @@
+from datetime import date, time
+
+import pytest
+from sqlalchemy import text
+
+from app import create_app, search
+from app.database import db
+from app.models import User, Patient, Appointment
+
+
+def ids(query, **kwargs):
+    return [(r['type'], r['id']) for r in search.search(query, **kwargs)[0]]
+
+
+@pytest.fixture
+def typed_patient(app):
+    user = User(username='spaced', role='patient')
+    user.set_password('patient123')
+    patient = Patient(user=user, full_name='Spaced Phone', phone='0911 234 567')
+    db.session.add(patient)
+    db.session.commit()
+    return patient
+
+
+@pytest.mark.parametrize('query', [
+    '0911 234 567', '0911234567', '911234567', '+251911234567', '251-911-234-567',
+    '0911', '91123', '2519112',
+])
+def test_phone_forms_find_the_patient(typed_patient, query):
+    assert ids(query, kinds=['patient']) == [('patient', typed_patient.id)]
+
+
+def test_dates_are_not_taken_for_phone_numbers(app):
+    assert search._match_expression('2030-01-07').endswith('("2030"* "01"* "07"*)')
+
+
+def test_rebuild_indexes_the_same_phone_text(typed_patient):
+    with db.engine.begin() as connection:
+        search.reindex(connection)
+    phone = db.session.execute(text(
+        "SELECT phone FROM search_index WHERE rowid = :rowid"),
+        {'rowid': search._rowid('patient', typed_patient.id)}).scalar()
+    assert phone == search.phone_search_text('0911 234 567', '+251911234567')
+    assert ids('911234567') == [('patient', typed_patient.id)]
+
+
+def test_index_in_an_older_layout_is_rebuilt(app, config, typed_patient):
+    patient_id = typed_patient.id
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP TABLE search_index'))
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE search_index USING fts5(kind UNINDEXED, entity_id UNINDEXED, "
+            "name, phone, email, reference, doctor)"))
+    db.session.remove()
+    db.engine.dispose()
+
+    with create_app(config).app_context():
+        assert search._LAYOUT in search._index_sql(db.session.connection())
+        assert ids('0911234567') == [('patient', patient_id)]
+
+
+@pytest.fixture
+def booked(app, doctor, patient):
+    appointment = Appointment(reference_number='APTSYNC0001', patient=patient, doctor=doctor,
+                              appointment_date=date(2030, 1, 7), appointment_time=time(9))
+    db.session.add(appointment)
+    db.session.commit()
+    return appointment
+
+
+def test_new_rows_are_indexed_on_flush(booked):
+    assert ids('aptsync') == [('appointment', booked.id)]
+    assert ('doctor', booked.doctor_id) in ids('dr test')
+
+
+def test_renaming_a_patient_updates_their_appointments(booked):
+    booked.patient.full_name = 'Renamed Person'
+    db.session.commit()
+
+    assert ids('test patient') == []
+    assert set(ids('renamed')) == {('patient', booked.patient_id), ('appointment', booked.id)}
+
+
+def test_changing_a_phone_updates_patient_and_appointment_rows(booked):
+    booked.patient.phone = '0922 000 111'
+    db.session.commit()
+
+    assert ids('0911234567') == []
+    assert set(ids('0922000111')) == {('patient', booked.patient_id),
+                                      ('appointment', booked.id)}
+
+
+def test_renaming_a_doctor_updates_their_appointments(booked):
+    booked.doctor.name = 'Dr. Other'
+    db.session.commit()
+
+    assert ids('other', kinds=['appointment']) == [('appointment', booked.id)]
+
+
+def test_deleted_rows_leave_the_index(booked):
+    appointment_id = booked.id
+    db.session.delete(booked)
+    db.session.commit()
+
+    assert ids('aptsync') == []
+    count = db.session.execute(text("SELECT COUNT(*) FROM search_index WHERE rowid = :rowid"),
+                               {'rowid': search._rowid('appointment', appointment_id)}).scalar()
+    assert count == 0